@@ -0,0 +1,64 @@
+"""Compare cross-validation with a model compiled once to refitting a new model per cutoff.
+
+The naive backtest builds, compiles and fits a new PMProphet model on the
+data before each cutoff, then predicts the horizon. `cross_validate` builds
+and compiles the model once, masking the rows after each cutoff.
+
+Usage: python benchmarks/bench_cross_validation.py [n_rows] [draws] [n_workers]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from pmprophet import PMProphet, cross_validate, performance_metrics
+from pmprophet.diagnostics import cutoffs
+
+PEYTON_MANNING = os.path.join(os.path.dirname(__file__), '..', 'examples', 'example_wp_log_peyton_manning.csv')
+INITIAL, PERIOD, HORIZON = '%d days', '90 days', '30 days'
+SAMPLE_KWARGS = {'tune': 200, 'chains': 1, 'progressbar': False, 'compute_convergence_checks': False}
+
+
+def build_model(df):
+    m = PMProphet(df, growth=True, name='bench', n_changepoints=10)
+    m.add_seasonality(seasonality=365.25, fourier_order=5)
+    m.add_seasonality(seasonality=7, fourier_order=3)
+    return m
+
+
+def naive(df, initial, draws):
+    forecasts = []
+    for cutoff in cutoffs(df['ds'], initial, PERIOD, HORIZON):
+        m = build_model(df[df['ds'] <= cutoff])
+        m.fit(draws, sample_kwargs=SAMPLE_KWARGS)
+        periods = int((pd.Timedelta(HORIZON) / pd.Timedelta('1 day')))
+        ddf = m.predict(periods, include_history=False)
+        forecasts.append(ddf.merge(df, on='ds').assign(cutoff=cutoff))
+    return pd.concat(forecasts, ignore_index=True)
+
+
+def run(n_rows=1000, draws=200, n_workers=1):
+    df = pd.read_csv(PEYTON_MANNING).iloc[-n_rows:]
+    df['ds'] = pd.to_datetime(df['ds'])
+    initial = INITIAL % int(0.7 * n_rows)
+
+    print("%-22s %10s %8s %10s" % ('backtest', 'time [s]', 'mae', 'coverage'))
+    start = time.time()
+    forecasts = naive(df, initial, draws)
+    elapsed = time.time() - start
+    mae = np.mean(np.abs(forecasts['y'] - forecasts['y_hat']))
+    coverage = ((forecasts['y'] >= forecasts['y_low']) & (forecasts['y'] <= forecasts['y_high'])).mean()
+    print("%-22s %10.1f %8.3f %10.3f" % ('refit per cutoff', elapsed, mae, coverage))
+
+    start = time.time()
+    forecasts = cross_validate(build_model(df), initial, PERIOD, HORIZON, draws=draws, n_workers=n_workers,
+                               sample_kwargs=SAMPLE_KWARGS)
+    elapsed = time.time() - start
+    metrics = performance_metrics(forecasts)
+    print("%-22s %10.1f %8.3f %10.3f" % ('cross_validate', elapsed, metrics['mae'].mean(), metrics['coverage'].mean()))
+
+
+if __name__ == '__main__':
+    run(*[int(arg) for arg in sys.argv[1:4]])
@@ -0,0 +1,45 @@
+"""Compare the vectorized design-matrix likelihood against the per-column loop.
+
+Reports the size of the model graph, the time needed to compile the
+log-probability and its gradient, and the NUTS sampling throughput.
+
+Usage: python benchmarks/bench_design_matrix.py [n_rows] [n_regressors]
+"""
+import sys
+import time
+
+import pymc3 as pm
+
+try:
+    from theano.graph.basic import ancestors
+except ImportError:  # Theano < 1.1
+    from theano.gof.graph import ancestors
+
+from pmprophet.testing import build_model, synthetic_data
+
+
+def run(n_rows=1000, n_regressors=30, draws=200, tune=200):
+    df = synthetic_data(n_rows, n_regressors)
+    print("%-10s %12s %12s %12s" % ('mode', 'graph nodes', 'compile [s]', 'draws/sec'))
+    for vectorize in (False, True):
+        m = build_model(df, vectorize=vectorize)
+        m.add_seasonality(seasonality=30, fourier_order=5)
+        m.finalize_model()
+        n_nodes = len([v for v in ancestors([m.model.logpt]) if v.owner is not None])
+
+        start = time.time()
+        m.model.logp_dlogp_function()
+        compile_time = time.time() - start
+
+        with m.model:
+            start = time.time()
+            pm.sample(draws, tune=tune, chains=1, cores=1, progressbar=False, compute_convergence_checks=False)
+            sampling_time = time.time() - start
+
+        print("%-10s %12d %12.2f %12.1f" % (
+            'vectorized' if vectorize else 'loop', n_nodes, compile_time, (draws + tune) / sampling_time
+        ))
+
+
+if __name__ == '__main__':
+    run(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,59 @@
+"""Compare float32 and float64 models: accuracy, memory and throughput of the forecasts.
+
+Both models get the same posterior draws, the float32 one rounded to single
+precision, so that their forecasts only differ by the precision of the
+computation. The relative difference of the forecasts, and of the fitted
+growth and seasonality, is reported (and bounded in tests/test_float32.py).
+The latency and the peak memory of `predict` are measured with the same
+`chunk_size`.
+
+Usage: python benchmarks/bench_float32.py [n_draws] [forecasting_periods]
+"""
+import sys
+import time
+
+import numpy as np
+
+from pmprophet import Profile
+from pmprophet.testing import float_models, relative_difference
+
+REPEAT = 5
+
+
+def run(n_draws=2000, forecasting_periods=365):
+    models = float_models(2000, n_draws, profile=Profile(memory=True))
+    chunk_size = 1000
+
+    forecasts, timings = {}, {}
+    for dtype, m in models.items():
+        m.predict(1)  # Compile the predictor
+        times = []
+        for _ in range(REPEAT):
+            start = time.time()
+            forecasts[dtype] = m.predict(forecasting_periods, chunk_size=chunk_size, quantiles=[0.1, 0.9],
+                                         random_state=np.random.default_rng(0))
+            times.append(time.time() - start)
+        timings[dtype] = min(times), m.profile.records[-1]['peak_memory']
+
+    reference, value = models['float64'], models['float32']
+    differences = {
+        'fit_growth': relative_difference(reference.fit_growth(prior=False), value.fit_growth(prior=False)),
+        'fit_seasonality': relative_difference(reference.fit_seasonality(), value.fit_seasonality()),
+        'y_hat': relative_difference(forecasts['float64']['y_hat'], forecasts['float32']['y_hat']),
+    }
+    # The intervals also differ by the noise, drawn from the same seed in either precision
+    for column in ('y_low', 'y_high', 'y_p10', 'y_p90'):
+        differences[column] = relative_difference(forecasts['float64'][column], forecasts['float32'][column])
+
+    rows = len(forecasts['float64'])
+    print("%-10s %10s %14s %16s" % ('dtype', 'time [s]', 'rows/s', 'peak memory [MB]'))
+    for dtype, (seconds, peak_memory) in timings.items():
+        print("%-10s %10.3f %14.0f %16.1f" % (dtype, seconds, rows / seconds, peak_memory / 2 ** 20))
+    print()
+    print("%-16s %22s" % ('output', 'relative difference'))
+    for name, difference in differences.items():
+        print("%-16s %22.2e" % (name, difference))
+
+
+if __name__ == '__main__':
+    run(*[int(arg) for arg in sys.argv[1:3]])
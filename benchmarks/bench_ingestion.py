@@ -0,0 +1,57 @@
+"""Compare the memory needed to build a model from a DataFrame and from column sources.
+
+A synthetic series of `n_rows` hourly observations with a daily and a weekly
+seasonality and a regressor is written to a CSV file, and loaded either with `pd.read_csv` into
+a DataFrame passed to PMProphet, or directly as a chunked CSV source or as
+NumPy arrays. Reports the time and peak memory allocated to build the model
+and its features.
+
+Usage: python benchmarks/bench_ingestion.py [n_rows]
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+from pmprophet import PMProphet
+from pmprophet.testing import synthetic_data
+
+
+def build_model(source):
+    m = PMProphet(source, growth=True, name='bench', n_changepoints=10, columns=['r_0'])
+    m.add_seasonality(seasonality=1, fourier_order=6)
+    m.add_seasonality(seasonality=7, fourier_order=3)
+    m.add_regressor('r_0')
+    m._feature_arrays()
+    return m
+
+
+def run(n_rows=10 ** 6):
+    df = synthetic_data(n_rows, freq='H', periods=(24, 24 * 7))
+    arrays = {column: df[column].values for column in df.columns}
+    path = os.path.join(tempfile.mkdtemp(), 'bench.csv')
+    df.to_csv(path, index=False)
+    del df
+
+    sources = [
+        ('DataFrame', lambda: pd.read_csv(path)),
+        ('CSV chunks', lambda: path),
+        ('arrays', lambda: arrays),
+    ]
+    print("%-12s %10s %16s" % ('source', 'time [s]', 'peak alloc [MB]'))
+    for name, source in sources:
+        tracemalloc.start()
+        start = time.time()
+        build_model(source())
+        elapsed = time.time() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print("%-12s %10.2f %16.1f" % (name, elapsed, peak / 2 ** 20))
+    os.remove(path)
+
+
+if __name__ == '__main__':
+    run(*[int(arg) for arg in sys.argv[1:2]])
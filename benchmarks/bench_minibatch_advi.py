@@ -0,0 +1,40 @@
+"""Compare the time to convergence of minibatch ADVI and full-batch ADVI.
+
+Fits a synthetic series with daily seasonality and a regressor, stopping
+ADVI once its ELBO reaches a plateau (see the `tolerance` of
+`PMProphet.fit`), and reports the time, the iteration at which it
+converged, and the error of the posterior mean of the fitted series with
+respect to the noiseless series. A method that did not converge within
+`max_iterations` is reported as such, its time not being a time to
+convergence.
+
+Usage: python benchmarks/bench_minibatch_advi.py [n_rows] [batch_size]
+"""
+import sys
+import time
+
+import numpy as np
+
+from pmprophet import PMProphet
+from pmprophet.testing import synthetic_data
+
+
+def run(n_rows=10 ** 6, batch_size=1000, max_iterations=50000, tolerance=1e-3):
+    df = synthetic_data(n_rows, freq='H', periods=(24,), trend=0, scale=0.5)
+    mean = synthetic_data(n_rows, freq='H', periods=(24,), trend=0, scale=0)['y'].values
+    print("%-16s %10s %14s %12s" % ('method', 'time [s]', 'converged at', 'RMSE'))
+    for method in ('advi', 'minibatch-advi'):
+        m = PMProphet(df, name='bench', store_components=False)
+        m.add_seasonality(seasonality=1, fourier_order=4)
+        m.add_regressor('r_0')
+        start = time.time()
+        m.fit(max_iterations, method=method, batch_size=batch_size, posterior_samples=500, tolerance=tolerance)
+        elapsed = time.time() - start
+        rmse = np.sqrt(np.mean((m.component_draws('y').mean(axis=0) - mean) ** 2))
+        iterations = len(m.elbo_history)
+        converged = '%d' % iterations if iterations < max_iterations else 'not converged'
+        print("%-16s %10.1f %14s %12.4f" % (method, elapsed, converged, rmse))
+
+
+if __name__ == '__main__':
+    run(*[int(arg) for arg in sys.argv[1:3]])
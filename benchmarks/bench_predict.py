@@ -0,0 +1,55 @@
+"""Compare the compiled posterior-predictive function against NumPy.
+
+The NumPy reference evaluates the mean the way `predict` used to, with
+hand-written arithmetic over the posterior draws, while the predictor
+evaluates the model's own mean expression through a compiled Theano
+function.
+
+Usage: python benchmarks/bench_predict.py [n_rows] [n_draws]
+"""
+import sys
+import time
+
+import numpy as np
+
+from pmprophet import PMProphetPredictor
+from pmprophet.testing import build_model, fake_trace, synthetic_data
+
+
+def numpy_mean(m):
+    x = np.arange(len(m.data), dtype=np.float64)
+    trace = {prior: m.trace['%s_%s' % (prior, m.name)] for prior in m.priors}
+    y_hat = trace['intercept'] + np.multiply.outer(x, trace['growth'])
+    y_hat += np.dot(m._changepoint_matrix(), trace['changepoints'].T)
+    y_hat += np.dot(m._feature_arrays()['seasonality'], trace['seasonality'].T)
+    return y_hat
+
+
+def run(n_rows=2000, n_draws=4000):
+    # Fake posterior draws, sampling is not what is being measured here
+    m = fake_trace(build_model(synthetic_data(n_rows, n_regressors=0), n_changepoints=25), n_draws)
+
+    start = time.time()
+    expected = numpy_mean(m)
+    numpy_time = time.time() - start
+
+    start = time.time()
+    predictor = m.predictor = PMProphetPredictor(m)
+    compile_time = time.time() - start
+
+    x = np.arange(n_rows, dtype=np.float64)
+    features = {'seasonality': predictor.history['seasonality']}
+    start = time.time()
+    _, y_hat = next(predictor.posterior_mean_chunks(x, features, n_rows))
+    compiled_time = time.time() - start
+
+    assert np.allclose(y_hat, expected)
+    print("numpy: %.3fs, compiled: %.3fs (+ %.2fs compilation)" % (numpy_time, compiled_time, compile_time))
+
+    start = time.time()
+    m.predict(365, chunk_size=500)
+    print("predict, 365 days ahead: %.3fs" % (time.time() - start))
+
+
+if __name__ == '__main__':
+    run(*[int(arg) for arg in sys.argv[1:3]])
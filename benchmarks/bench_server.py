@@ -0,0 +1,43 @@
+"""Compare the throughput of sequential forecasts with the ForecastServer.
+
+Sends `n_requests` requests for the same forecast, each with its own seed,
+either one `predict` call at a time or concurrently to a ForecastServer,
+which coalesces them into a few evaluations of the posterior.
+
+Usage: python benchmarks/bench_server.py [n_requests] [n_draws]
+"""
+import sys
+import time
+
+from pmprophet import ForecastServer, LocalClient
+from pmprophet.testing import build_model, fake_trace, synthetic_data
+
+
+def fitted_model(n_draws, n_rows=2000):
+    return fake_trace(build_model(synthetic_data(n_rows, n_regressors=0), n_changepoints=25), n_draws)
+
+
+def run(n_requests=64, n_draws=2000):
+    m = fitted_model(n_draws)
+    m.predict(1)  # Compile the predictor
+
+    start = time.time()
+    for seed in range(n_requests):
+        m.predict(365, include_history=False, random_state=seed)
+    sequential = time.time() - start
+
+    with LocalClient(ForecastServer({'bench': m}, max_workers=4)) as client:
+        start = time.time()
+        client.forecast_many([
+            {'model': 'bench', 'forecasting_periods': 365, 'seed': seed} for seed in range(n_requests)
+        ])
+        served = time.time() - start
+        evaluations = client.server.stats['evaluations']
+
+    print("%-12s %10s %14s %12s" % ('mode', 'time [s]', 'requests/s', 'evaluations'))
+    print("%-12s %10.3f %14.1f %12d" % ('sequential', sequential, n_requests / sequential, n_requests))
+    print("%-12s %10.3f %14.1f %12d" % ('server', served, n_requests / served, evaluations))
+
+
+if __name__ == '__main__':
+    run(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,46 @@
+"""Compare sampling with and without the per-draw component Deterministics.
+
+Reports the NUTS sampling throughput, the size of the trace, the peak memory
+allocated while sampling and the time needed to compute the fitted `y` of
+every draw afterwards with `component_draws`.
+
+Usage: python benchmarks/bench_store_components.py [n_rows] [draws]
+"""
+import sys
+import time
+import tracemalloc
+
+import pymc3 as pm
+
+from pmprophet.testing import build_model, synthetic_data
+
+
+def run(n_rows=3000, draws=500, tune=200):
+    df = synthetic_data(n_rows)
+    print("%-10s %12s %12s %16s %16s" % ('components', 'draws/sec', 'trace [MB]', 'peak alloc [MB]', 'y draws [s]'))
+    for store_components in (True, False):
+        m = build_model(df, store_components=store_components)
+        m.add_holiday('holiday', df['ds'].iloc[len(df) // 2], df['ds'].iloc[len(df) // 2 + 7])
+        m.finalize_model()
+        with m.model:
+            tracemalloc.start()
+            start = time.time()
+            m.trace = pm.sample(draws, tune=tune, chains=1, cores=1, progressbar=False,
+                                compute_convergence_checks=False)
+            sampling_time = time.time() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+        trace_size = sum(m.trace[name].nbytes for name in m.trace.varnames)
+        start = time.time()
+        m.component_draws('y')
+        components_time = time.time() - start
+
+        print("%-10s %12.1f %12.1f %16.1f %16.3f" % (
+            'stored' if store_components else 'lazy', (draws + tune) / sampling_time, trace_size / 2 ** 20,
+            peak / 2 ** 20, components_time
+        ))
+
+
+if __name__ == '__main__':
+    run(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,234 @@
+"""Benchmark suite of the fit, predict and plotting hot paths.
+
+The classes follow the asv conventions (`params`, `setup`, and `time_*`,
+`peakmem_*` and `track_*` methods), so the suite runs with `asv run`
+using `asv.conf.json`. It also runs standalone, without asv, writing a JSON
+report that can be tracked over releases:
+
+    python benchmarks/suite.py [--quick] [--filter NAME] [--output report.json]
+
+`--quick` only runs the smallest two values of each parameter.
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import pymc3 as pm
+import theano
+
+from pmprophet import PMProphet
+from pmprophet.profiling import graph_nodes
+from pmprophet.testing import build_model, fake_trace, synthetic_data
+
+PEYTON_MANNING = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'examples',
+                              'example_wp_log_peyton_manning.csv')
+
+
+def sample(m, draws, tune=200):
+    """Sample a finalized model, returning the trace and the sampling time."""
+    with m.model:
+        start = time.time()
+        trace = pm.sample(draws, tune=tune, chains=2, cores=1, progressbar=False, compute_convergence_checks=False)
+        return trace, time.time() - start
+
+
+def min_ess(trace, m):
+    """Smallest effective sample size among the parameters."""
+    with m.model:
+        ess = pm.ess(trace, var_names=['%s_%s' % (prior, m.name) for prior in m.priors])
+    return min(float(ess[name].values.min()) for name in ess.data_vars)
+
+
+class Compile:
+    """Model graph size and compilation of the log-probability and its gradient."""
+    params = ([1000, 10000, 100000, 1000000], [0, 25, 200], [3, 10])
+    param_names = ['n_rows', 'n_changepoints', 'fourier_order']
+    timeout = 600
+
+    def setup(self, n_rows, n_changepoints, fourier_order):
+        self.m = build_model(synthetic_data(n_rows), n_changepoints, fourier_order, store_components=False)
+        self.m.finalize_model()
+
+    def time_compile(self, n_rows, n_changepoints, fourier_order):
+        self.m.model.logp_dlogp_function()
+
+    def track_graph_nodes(self, n_rows, n_changepoints, fourier_order):
+        return graph_nodes(self.m.model.logpt)
+    track_graph_nodes.unit = 'nodes'
+
+
+class Sampling:
+    """NUTS throughput, in draws and effective samples per second."""
+    params = ([1000, 10000], [0, 25], [200, 1000])
+    param_names = ['n_rows', 'n_changepoints', 'draws']
+    timeout = 1800
+
+    def setup(self, n_rows, n_changepoints, draws):
+        m = build_model(synthetic_data(n_rows), n_changepoints, store_components=False)
+        m.finalize_model()
+        trace, self.elapsed = sample(m, draws)
+        self.draws = 2 * (draws + 200)
+        self.ess = min_ess(trace, m)
+
+    def track_draws_per_second(self, n_rows, n_changepoints, draws):
+        return self.draws / self.elapsed
+    track_draws_per_second.unit = 'draws/s'
+
+    def track_ess_per_second(self, n_rows, n_changepoints, draws):
+        return self.ess / self.elapsed
+    track_ess_per_second.unit = 'ess/s'
+
+
+class Predict:
+    """Latency and memory of `predict`, with the forecast cache bypassed."""
+    params = ([1000, 10000, 100000, 1000000], [500, 4000])
+    param_names = ['n_rows', 'n_draws']
+    timeout = 600
+
+    def setup(self, n_rows, n_draws):
+        self.m = fake_trace(build_model(synthetic_data(n_rows, n_regressors=0), n_changepoints=25), n_draws)
+        self.m.predict(1)  # Compile the predictor
+
+    def time_predict(self, n_rows, n_draws):
+        self.m.predictor._cache.clear()
+        self.m.predict(365)
+
+    def peakmem_predict(self, n_rows, n_draws):
+        self.m.predictor._cache.clear()
+        self.m.predict(365)
+
+
+class Components:
+    """Posterior components used by the plots."""
+    params = ([1000, 10000, 100000], [0, 25, 200], [3, 10, 20])
+    param_names = ['n_rows', 'n_changepoints', 'fourier_order']
+    timeout = 600
+
+    def setup(self, n_rows, n_changepoints, fourier_order):
+        self.m = fake_trace(build_model(synthetic_data(n_rows), n_changepoints, fourier_order), 500)
+
+    def time_fit_growth(self, n_rows, n_changepoints, fourier_order):
+        self.m.fit_growth(prior=False)
+
+    def time_fit_seasonality(self, n_rows, n_changepoints, fourier_order):
+        self.m.fit_seasonality()
+
+    def time_make_trend(self, n_rows, n_changepoints, fourier_order):
+        self.m.make_trend(0.05)
+
+    def peakmem_make_trend(self, n_rows, n_changepoints, fourier_order):
+        self.m.make_trend(0.05)
+
+
+class PeytonManning:
+    """The Peyton Manning series of the examples, with the model of the README."""
+    params = ([500, 2000],)
+    param_names = ['draws']
+    timeout = 1800
+
+    def setup(self, draws):
+        self.m = PMProphet(pd.read_csv(PEYTON_MANNING), growth=True, intercept=True, name='model',
+                           n_changepoints=25, store_components=False)
+        self.m.add_seasonality(seasonality=365.25, fourier_order=10)
+        self.m.add_seasonality(seasonality=7, fourier_order=3)
+        self.m.finalize_model()
+        self.trace, self.elapsed = sample(self.m, draws)
+        self.draws = 2 * (draws + 200)
+        self.m.trace = self.trace
+
+    def track_draws_per_second(self, draws):
+        return self.draws / self.elapsed
+    track_draws_per_second.unit = 'draws/s'
+
+    def track_ess_per_second(self, draws):
+        return min_ess(self.trace, self.m) / self.elapsed
+    track_ess_per_second.unit = 'ess/s'
+
+    def time_predict(self, draws):
+        self.m.predictor = None
+        self.m.predict(365)
+
+
+BENCHMARKS = [Compile, Sampling, Predict, Components, PeytonManning]
+
+
+def measure(benchmark, method, params, repeat=3):
+    """Run a benchmark method the way asv would, returning (value, unit)."""
+    kind = method.__name__.split('_')[0]
+    if kind == 'time':
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            method(*params)
+            timings.append(time.perf_counter() - start)
+        return min(timings), 'seconds'
+    if kind == 'peakmem':
+        tracemalloc.start()
+        try:
+            method(*params)
+            return tracemalloc.get_traced_memory()[1], 'bytes'
+        finally:
+            tracemalloc.stop()
+    return method(*params), getattr(method, 'unit', 'unit')
+
+
+def run(quick=False, name_filter=None, output=None):
+    results = []
+    for cls in BENCHMARKS:
+        grid = [values[:2] if quick else values for values in cls.params]
+        methods = sorted(name for name in dir(cls) if name.startswith(('time_', 'peakmem_', 'track_')))
+        methods = ['%s.%s' % (cls.__name__, name) for name in methods]
+        methods = [name for name in methods if not name_filter or name_filter in name]
+        if not methods:
+            continue
+
+        for params in itertools.product(*grid):
+            benchmark = cls()
+            try:
+                benchmark.setup(*params)
+            except Exception as e:
+                print("%s%r: setup failed: %s" % (cls.__name__, params, e), file=sys.stderr)
+                continue
+            for name in methods:
+                value, unit = measure(benchmark, getattr(benchmark, name.split('.')[1]), params)
+                result = {
+                    'benchmark': name,
+                    'params': dict(zip(cls.param_names, params)),
+                    'value': value,
+                    'unit': unit,
+                }
+                results.append(result)
+                print("%-40s %-60s %14.6g %s" % (name, result['params'], value, unit))
+
+    report = {
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'machine': {'platform': platform.platform(), 'processor': platform.processor(), 'cpus': os.cpu_count()},
+        'versions': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'pymc3': pm.__version__,
+            'theano': theano.__version__,
+        },
+        'results': results,
+    }
+    if output:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--quick', action='store_true', help="Only the smallest two values of each parameter")
+    parser.add_argument('--filter', default=None, help="Only the benchmarks whose name contains this string")
+    parser.add_argument('--output', default='benchmark-report.json', help="Path of the JSON report")
+    arguments = parser.parse_args()
+    run(arguments.quick, arguments.filter, arguments.output)
@@ -1,2 +1,8 @@
-
-from .model import PMProphet
\ No newline at end of file
+from .model import PMProphet
+from .predictor import PMProphetPredictor
+from .batch import PMProphetBatch
+from .parallel import fit_parallel
+from .profiling import Profile
+from .server import ForecastServer, LocalClient
+from .diagnostics import cross_validate, performance_metrics
+from .plotting import render_components
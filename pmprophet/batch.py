@@ -0,0 +1,236 @@
+import numpy as np
+import pandas as pd
+import pymc3 as pm
+import theano.tensor as tt
+
+from .model import PMProphet
+from .predictor import PMProphetPredictor, quantile_columns
+
+
+class PMProphetBatch:
+    """Prophet forecaster for many series sharing the same layout.
+
+    All the series share the dates, seasonality, holidays, regressors and
+    changepoints, and are fitted in a single PyMC3 model where every prior
+    has a leading series dimension.
+
+    Parameters
+    ----------
+    data : pd.DataFrame (with 'y', 'ds' and `series` columns)
+        Data of all the series, in long format. Regressors take a single
+        value per date, shared by all the series.
+    series : string
+        Name of the column identifying the series.
+    pool : bool
+        Partially pool the growth, changepoints, seasonality, holidays and
+        regressors coefficients across the series with a hierarchical prior.
+    kwargs :
+        Additional arguments for PMProphet (`growth`, `intercept`, `model`,
+        `name`, `changepoints`, `n_changepoints`, `dtype`).
+    """
+    def __init__(self, data, series='series', pool=False, **kwargs):
+        if series not in data.columns:
+            raise Exception("Series identifier should be called `%s` in the `data` dataframe" % series)
+
+        ds = pd.to_datetime(data['ds'])
+        y = pd.DataFrame({'ds': ds, series: data[series], 'y': data['y']}).pivot(
+            index='ds', columns=series, values='y'
+        ).sort_index()
+        layout = data.drop(columns=[series, 'y']).assign(ds=ds).groupby('ds').first().reindex(y.index)
+        layout['y'] = y.mean(axis=1)
+
+        self.layout = PMProphet(layout.reset_index(), **kwargs)
+        self.series = list(y.columns)
+        self.y = y.values
+        self.pool = pool
+        self.name = self.layout.name
+        self.model = self.layout.model
+        self.priors = {}
+        self.trace = {}
+        self.start = {}
+        self.predictor = None
+
+    def add_seasonality(self, seasonality, fourier_order):
+        """Add a seasonal component shared by all the series.
+
+        See `PMProphet.add_seasonality`.
+        """
+        self.layout.add_seasonality(seasonality, fourier_order)
+        return self
+
+    def add_holiday(self, name, date_start, date_end):
+        """Add holiday features shared by all the series.
+
+        See `PMProphet.add_holiday`.
+        """
+        self.layout.add_holiday(name, date_start, date_end)
+        return self
+
+    def add_holidays(self, events, scale=None):
+        """Add holidays shared by all the series from a table of events.
+
+        See `PMProphet.add_holidays`.
+        """
+        self.layout.add_holidays(events, scale)
+        return self
+
+    def add_regressor(self, name, regressor=None):
+        """Add a regressor shared by all the series.
+
+        See `PMProphet.add_regressor`.
+        """
+        self.layout.add_regressor(name, regressor)
+        return self
+
+    def _coefficients(self, prior, distribution, scale, size=None):
+        """Coefficients with a leading series dimension, optionally pooled."""
+        shape = (len(self.series),) if size is None else (len(self.series), size)
+        name = '%s_%s' % (prior, self.name)
+        if not self.pool:
+            return distribution(name, 0, scale, shape=shape)
+        mu = distribution('%s_mu_%s' % (prior, self.name), 0, scale, shape=shape[1:])
+        sd = pm.HalfNormal('%s_sd_%s' % (prior, self.name), scale, shape=shape[1:])
+        offset = pm.Normal('%s_offset_%s' % (prior, self.name), 0, 1, shape=shape)
+        return pm.Deterministic(name, mu + sd * offset)
+
+    def generate_priors(self):
+        """Set up the priors for the model, one set of coefficients per series."""
+        layout = self.layout
+        with self.model, layout._floatx():
+            if 'sigma' not in self.priors:
+                self.priors['sigma'] = pm.HalfCauchy('sigma_%s' % self.name, 10, shape=len(self.series), testval=1.)
+            if 'seasonality' not in self.priors and layout.seasonality:
+                self.priors['seasonality'] = self._coefficients('seasonality', pm.Laplace, 10, len(layout.seasonality))
+            if 'holidays' not in self.priors and layout.holidays:
+                self.priors['holidays'] = self._coefficients('holidays', pm.Laplace, 10, len(layout.holidays))
+            if 'regressors' not in self.priors and layout.regressors:
+                self.priors['regressors'] = self._coefficients('regressors', pm.Normal, 10, len(layout.regressors))
+            if layout.growth and 'growth' not in self.priors:
+                self.priors['growth'] = self._coefficients('growth', pm.Normal, 0.5)
+            if layout.growth and 'changepoints' not in self.priors and len(layout.changepoints):
+                self.priors['changepoints'] = self._coefficients('changepoints', pm.Laplace, 0.5,
+                                                                 len(layout.changepoints))
+            if layout.intercept and 'intercept' not in self.priors:
+                self.priors['intercept'] = pm.Normal('intercept_%s' % self.name, np.nanmean(self.y, axis=0),
+                                                     np.nanstd(self.y, axis=0, ddof=1) * 2,
+                                                     shape=len(self.series), testval=1.0)
+
+    def finalize_model(self):
+        """Finalize the model."""
+        self.generate_priors()
+        layout = self.layout
+        with layout._floatx():
+            components = layout._components(layout._as_variables(layout._feature_arrays()), self.priors)
+            y_hat = tt.zeros((len(self.y), 1)) + sum(components.values())
+
+        mean = np.nanmean(self.y, axis=0).astype(layout.dtype)
+        std = np.nanstd(self.y, axis=0, ddof=1).astype(layout.dtype)
+        rows, cols = np.nonzero(~np.isnan(self.y))
+        with self.model, layout._floatx():
+            pm.Normal(
+                'y_%s' % self.name,
+                mu=((y_hat - mean) / std)[rows, cols],
+                sd=self.priors['sigma'][cols],
+                observed=((self.y - mean) / std)[rows, cols].astype(layout.dtype)
+            )
+
+    def fit(self, draws=500, method='NUTS', map_initialization=False, finalize=True, step_kwargs={}, sample_kwargs={},
+            posterior_samples=10 ** 4):
+        """Fit all the series at once.
+
+        Parameters
+        ----------
+        draws : int, > 0
+            The number of MCMC samples, or of ADVI iterations.
+        method : 'NUTS' or 'Metropolis'.
+            Any other value fits the model with ADVI, except the 'MAP',
+            'laplace' and 'minibatch-advi' methods of `PMProphet.fit`, which
+            are not supported.
+        map_initialization : bool
+            Initialize the model with maximum a posteriori estimates.
+        finalize : bool
+            Finalize the model.
+        step_kwargs : dict
+            Additional arguments for the sampling algorithms
+            (`NUTS` or `Metropolis`).
+        sample_kwargs : dict
+            Additional arguments for the PyMC3 `sample` function.
+        posterior_samples : int
+            Number of samples drawn from the ADVI approximation.
+
+        Returns
+        -------
+        The fitted PMProphetBatch object.
+        """
+        if method in ('MAP', 'laplace', 'minibatch-advi'):
+            raise Exception("Batch models cannot be fitted with the '%s' method" % method)
+        if finalize:
+            self.finalize_model()
+
+        with self.model, self.layout._floatx():
+            if map_initialization:
+                self.start = pm.find_MAP(maxeval=10000)
+
+            if draws:
+                if method == 'NUTS' or method == 'Metropolis':
+                    self.trace = pm.sample(
+                        draws,
+                        step=pm.Metropolis(**step_kwargs) if method == 'Metropolis' else pm.NUTS(**step_kwargs),
+                        start=self.start if map_initialization else None,
+                        **sample_kwargs
+                    )
+                else:
+                    res = pm.fit(draws, start=self.start if map_initialization else None)
+                    self.trace = res.sample(posterior_samples)
+
+        if draws:
+            self.predictor = self._make_predictor()
+
+        return self
+
+    def _make_predictor(self):
+        """Predictor of the layout, evaluating every (draw, series) pair as a draw."""
+        layout = self.layout
+        layout.priors = self.priors
+        layout.trace = {}
+        for prior in self.priors:
+            name = '%s_%s' % (prior, self.name)
+            value = self.trace[name]
+            layout.trace[name] = value.reshape((-1,) + value.shape[2:])
+        return PMProphetPredictor(layout)
+
+    def predict(self, forecasting_periods=10, freq='D', extra_data=None, include_history=True, alpha=0.05,
+                chunk_size=None, max_memory=2 ** 28, quantiles=None):
+        """Predict all the series with a single compiled function.
+
+        See `PMProphet.predict` for the description of the parameters.
+
+        Returns
+        -------
+        A dict with a pd.DataFrame with the forecast components of each series.
+        """
+        if self.predictor is None:
+            self.predictor = self._make_predictor()
+
+        ds, x, features = self.predictor.make_rows(forecasting_periods, freq, extra_data, include_history)
+
+        sigma = self.trace['sigma_%s' % self.name]
+        if chunk_size is None:
+            # y_hat, its noised version and the temporaries of np.percentile
+            chunk_size = max(1, int(max_memory // (4 * sigma.itemsize * sigma.size)))
+        noise = np.random.normal(0, sigma).astype(sigma.dtype, copy=False)
+
+        names, probabilities = quantile_columns(alpha, quantiles)
+        values = np.empty((1 + len(probabilities), len(x), len(self.series)))
+        for rows, y_hat in self.predictor.posterior_mean_chunks(x, features, chunk_size):
+            y_hat = y_hat.reshape((len(y_hat),) + sigma.shape)
+            values[0, rows] = np.quantile(y_hat, 0.5, axis=1)
+            y_hat += noise
+            values[1:, rows] = np.quantile(y_hat, probabilities, axis=1)
+
+        columns = ['y_hat'] + ['y_%s' % name for name in names]
+        forecasts = {}
+        for idx, series in enumerate(self.series):
+            forecasts[series] = pd.DataFrame(values[:, :, idx].T, columns=columns)
+            forecasts[series]['ds'] = ds
+        return forecasts
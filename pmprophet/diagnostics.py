@@ -0,0 +1,241 @@
+import pickle
+
+import numpy as np
+import pandas as pd
+import pymc3 as pm
+
+from .model import MAP_DRAWS
+from .parallel import _Worker, _worker_environ
+from .predictor import PMProphetPredictor, quantile_columns
+
+_backtest = None  # Backtest of the worker process
+
+
+def cutoffs(ds, initial, period, horizon):
+    """Cutoff dates of the folds, spaced by `period` back from the last date
+    minus `horizon`, leaving at least `initial` of data before the first.
+
+    Parameters
+    ----------
+    ds : array-like of datetimes
+    initial, period, horizon : string or pd.Timedelta
+        e.g. '730 days'.
+
+    Returns
+    -------
+    A pd.DatetimeIndex, in increasing order.
+    """
+    ds = pd.to_datetime(pd.Series(ds))
+    initial, period, horizon = pd.Timedelta(initial), pd.Timedelta(period), pd.Timedelta(horizon)
+    dates = []
+    cutoff = ds.max() - horizon
+    while cutoff >= ds.min() + initial:
+        dates.append(cutoff)
+        cutoff -= period
+    if not dates:
+        raise Exception("Less data than `initial` + `horizon`, no fold to evaluate")
+    return pd.DatetimeIndex(dates[::-1])
+
+
+class _Backtest:
+    """Model built and compiled once, refitted on the rows before each cutoff.
+
+    With NUTS, the likelihood of the rows after the cutoff is masked through
+    a shared variable and the compiled step is reused. The MAP and Laplace
+    fits are solved on the rows before the cutoff. The predictor is compiled
+    once and loaded with the draws of each fold.
+    """
+    def __init__(self, model, horizon, method, draws, alpha, seed, step_kwargs, sample_kwargs):
+        self.model = model
+        self.horizon = pd.Timedelta(horizon)
+        self.method = method
+        self.draws = draws
+        self.alpha = alpha
+        self.seed = seed
+        self.sample_kwargs = sample_kwargs
+        self.predictor = None
+        self.model.store_components = False
+        if method == 'MAP' or method == 'laplace':
+            self.model.generate_priors()
+        else:
+            self.model.finalize_model(mask=True)
+            with self.model.model, self.model._floatx():
+                self.step = pm.NUTS(**step_kwargs)
+
+    def fit(self, train):
+        """Fit the rows of the `train` mask, returning the number of divergent transitions."""
+        m = self.model
+        with m.model, m._floatx():
+            if self.method == 'MAP' or self.method == 'laplace':
+                draws = self.draws if self.method == 'laplace' else min(self.draws, MAP_DRAWS)
+                m.trace = m._laplace_trace(draws, rows=train)
+            else:
+                m.shared['mask'].set_value(train.astype(m.dtype))
+                m.trace = pm.sample(self.draws, step=self.step, **self.sample_kwargs)
+        if self.predictor is None:
+            self.predictor = PMProphetPredictor(m)
+        else:
+            self.predictor.load(m)
+        if self.method == 'MAP' or self.method == 'laplace':
+            return 0
+        return int(np.sum(m.trace.get_sampler_stats('diverging')))
+
+    def fold(self, idx, cutoff):
+        """Forecasts of the rows within `horizon` of `cutoff`, fitted on the rows before it."""
+        ds = self.model.data['ds'].values
+        cutoff = np.datetime64(cutoff, 'ns')
+        divergences = self.fit(ds <= cutoff)
+        posterior = self.predictor.posterior
+        if 'changepoints' in posterior:
+            # Without data, the changepoints after the cutoff only keep their prior
+            late = np.asarray(self.model.changepoints > cutoff)
+            posterior['changepoints'] = np.where(late, 0., posterior['changepoints'])
+
+        rows = np.flatnonzero((ds > cutoff) & (ds <= cutoff + self.horizon.to_timedelta64()))
+        columns = ['ds', 'cutoff', 'y', 'y_hat', 'y_low', 'y_high', 'divergences']
+        if not len(rows):
+            return pd.DataFrame(columns=columns)
+        features = {
+            component: value[rows] for component, value in self.predictor.history.items()
+            if component not in ('x', 'changepoints')
+        }
+        _, y_hat = next(self.predictor.posterior_mean_chunks(rows.astype(self.model.dtype), features, len(rows)))
+        sigma = self.predictor.posterior['sigma']
+        noise = np.random.default_rng(None if self.seed is None else [self.seed, idx]).normal(0, sigma).astype(
+            sigma.dtype, copy=False
+        )
+
+        forecast = pd.DataFrame({
+            'ds': ds[rows],
+            'cutoff': cutoff,
+            'y': self.model.data['y'].values[rows],
+            'y_hat': np.quantile(y_hat, 0.5, axis=-1),
+            'divergences': divergences,
+        })
+        names, probabilities = quantile_columns(self.alpha)
+        for name, value in zip(names, np.quantile(y_hat + noise, probabilities, axis=-1)):
+            forecast['y_%s' % name] = value
+        return forecast[columns]
+
+
+def _init_worker(model, args):
+    global _backtest
+    _backtest = _Backtest(pickle.loads(model), *args)
+
+
+def _fold(idx, cutoff):
+    return _backtest.fold(idx, cutoff)
+
+
+def cross_validate(m, initial, period, horizon, method='NUTS', draws=500, alpha=0.05, n_workers=1, seed=None,
+                   compile_dir=None, step_kwargs={}, sample_kwargs={}):
+    """Backtest a model configuration on historical cutoffs.
+
+    The model is fitted on the data up to each cutoff (see `cutoffs`) and
+    forecasts the following `horizon`. Its graph, sampler and predictor are
+    built and compiled once, per worker, and reused for all the folds: with
+    NUTS, the rows after the cutoff are masked in the likelihood (see
+    `PMProphet.finalize_model`). The changepoints, the scaling of `y` and the
+    prior of the intercept are those of the whole data, and the changepoints
+    after a cutoff are left out of its forecasts, which extrapolate the last
+    fitted growth as a model fitted on the data up to the cutoff would. The
+    folds thus have fewer changepoints than a model built on their data
+    only, with `n_changepoints`.
+
+    Parameters
+    ----------
+    m : PMProphet
+        The model to evaluate, with its seasonality, holidays and regressors,
+        not finalized. It is copied, and left unchanged.
+    initial : string or pd.Timedelta
+        Minimum length of the data of the first fold, e.g. '730 days'.
+    period : string or pd.Timedelta
+        Spacing between cutoffs.
+    horizon : string or pd.Timedelta
+        Length of the forecasts.
+    method : 'NUTS', 'MAP' or 'laplace'
+        See `PMProphet.fit`. The MAP fit keeps at most `MAP_DRAWS` samples
+        of the Laplace approximation, and the Laplace fit `draws`.
+    draws : int
+        Number of NUTS samples, or of samples of the Laplace approximation.
+    alpha : float
+        Width of the credible intervals.
+    n_workers : int
+        Number of processes evaluating the folds, each compiling the model
+        once. If 1, the folds are evaluated in this process. Otherwise, the
+        chains are sampled in the worker process unless `cores` is set in
+        `sample_kwargs`.
+    seed : int
+        Seed of the observation noise of the intervals.
+    compile_dir : string
+        Directory under which each worker gets its Theano compile directory,
+        see `fit_parallel`.
+    step_kwargs : dict
+        Additional arguments for `NUTS`.
+    sample_kwargs : dict
+        Additional arguments for the PyMC3 `sample` function. The folds of a
+        worker share their sampler, so the divergence warnings it logs add
+        up over them, and its convergence checks are off by default.
+
+    Returns
+    -------
+    A pd.DataFrame with the forecasts of each fold, with the `ds`, `cutoff`,
+    `y`, `y_hat`, `y_low` and `y_high` columns, see `performance_metrics`,
+    and the number of divergent NUTS transitions of the fit of the fold in
+    `divergences`.
+    """
+    if 'y_%s' % m.name in m.model.named_vars:
+        raise Exception("Cross-validate a model before finalizing or fitting it")
+    dates = cutoffs(m.data['ds'], initial, period, horizon)
+    model = pickle.dumps(m)
+    sample_kwargs = dict(sample_kwargs)
+    # The folds of a worker share a sampler, whose convergence warnings add up over them
+    sample_kwargs.setdefault('compute_convergence_checks', False)
+    if n_workers > 1:
+        sample_kwargs.setdefault('cores', 1)
+    args = (horizon, method, draws, alpha, seed, step_kwargs, sample_kwargs)
+
+    if n_workers == 1:
+        backtest = _Backtest(pickle.loads(model), *args)
+        forecasts = [backtest.fold(idx, cutoff) for idx, cutoff in enumerate(dates)]
+    else:
+        # A single thread per process, the folds being the unit of parallelism, and a compile directory per worker
+        workers = [
+            _Worker(_worker_environ(compile_dir, idx, 1), initializer=_init_worker, initargs=(model, args))
+            for idx in range(n_workers)
+        ]
+        failed = True
+        try:
+            futures = [workers[idx % n_workers].submit(_fold, idx, cutoff) for idx, cutoff in enumerate(dates)]
+            forecasts = [future.result() for future in futures]
+            failed = False
+        finally:
+            for worker in workers:
+                worker.close(terminate=failed)
+    return pd.concat(forecasts, ignore_index=True)
+
+
+def performance_metrics(forecasts):
+    """Error metrics of cross-validated forecasts, per horizon.
+
+    Parameters
+    ----------
+    forecasts : pd.DataFrame
+        Forecasts returned by `cross_validate`.
+
+    Returns
+    -------
+    A pd.DataFrame with, for each `horizon` (time from the cutoff), the
+    mean absolute error `mae`, the mean absolute percentage error `mape`
+    (over the non-zero `y`), the `coverage` of the credible intervals and
+    the number of forecasts `n`.
+    """
+    error = (forecasts['y'] - forecasts['y_hat']).abs()
+    metrics = pd.DataFrame({
+        'horizon': forecasts['ds'] - forecasts['cutoff'],
+        'mae': error,
+        'mape': error / forecasts['y'].abs().replace(0, np.nan),
+        'coverage': ((forecasts['y'] >= forecasts['y_low']) & (forecasts['y'] <= forecasts['y_high'])).astype(float),
+    })
+    grouped = metrics.groupby('horizon')
+    return grouped.mean().assign(n=grouped.size()).reset_index()
@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+import scipy.sparse
+
+
+def holiday_windows(events):
+    """Group a table of events by holiday, applying their windows.
+
+    Parameters
+    ----------
+    events : pd.DataFrame
+        One row per event, with the columns `name` (of the holiday), `start`
+        and optionally `end` (the first and last date of the event, `end`
+        defaults to `start`), `lower_window` and `upper_window` (number of
+        days by which the event is extended before its start and after its
+        end, `lower_window` being negative as in Prophet).
+
+    Returns
+    -------
+    A list of `(name, starts, ends)`, in the order of appearance of the
+    holidays, where `starts` and `ends` are datetime64[ns] arrays bounding,
+    inclusively, each event of the holiday.
+    """
+    for column in ('name', 'start'):
+        if column not in events.columns:
+            raise Exception("The events should have a `%s` column" % column)
+
+    start = pd.to_datetime(events['start'])
+    end = pd.to_datetime(events['end']) if 'end' in events.columns else start
+    if 'lower_window' in events.columns:
+        start = start + pd.to_timedelta(events['lower_window'].fillna(0), unit='D')
+    if 'upper_window' in events.columns:
+        end = end + pd.to_timedelta(events['upper_window'].fillna(0), unit='D')
+
+    names = events['name'].values
+    start = start.values.astype('datetime64[ns]')
+    end = end.values.astype('datetime64[ns]')
+    return [(name, start[names == name], end[names == name]) for name in pd.unique(names)]
+
+
+def holiday_features(dates, holiday_spec):
+    """Sparse holiday features, the scale of the holiday on the rows covered
+    by any of its events and zero elsewhere.
+
+    The rows of each event are found with a binary search on the sorted
+    dates, so the cost grows with the number of rows covered rather than with
+    the number of rows times the number of events.
+
+    Parameters
+    ----------
+    dates : array-like of datetimes
+    holiday_spec : list
+        `(name, starts, ends, scale)` of each holiday, see `holiday_windows`.
+
+    Returns
+    -------
+    A CSR matrix with shape (n_dates, n_holidays).
+    """
+    dates = np.asarray(dates, dtype='datetime64[ns]')
+    order = np.argsort(dates, kind='mergesort')
+    starts, ends = [
+        np.concatenate([np.empty(0, dtype='datetime64[ns]')] + [np.asarray(spec[idx], dtype='datetime64[ns]')
+                                                               for spec in holiday_spec])
+        for idx in (1, 2)
+    ]
+    columns = np.repeat(np.arange(len(holiday_spec)), [len(spec[1]) for spec in holiday_spec])
+
+    first = np.searchsorted(dates, starts, side='left', sorter=order)
+    last = np.searchsorted(dates, ends, side='right', sorter=order)
+    lengths = np.maximum(last - first, 0)
+    # Positions, in the sorted dates, of the rows covered by each event
+    offsets = np.repeat(first - np.cumsum(lengths) + lengths, lengths)
+    rows = order[np.arange(lengths.sum()) + offsets]
+
+    features = scipy.sparse.csr_matrix(
+        (np.ones(len(rows)), (rows, np.repeat(columns, lengths))), shape=(len(dates), len(holiday_spec))
+    )
+    # Overlapping events of the same holiday are summed, set them back to the scale
+    scales = np.array([spec[3] for spec in holiday_spec], dtype=np.float64)
+    features.data = scales[features.indices]
+    return features
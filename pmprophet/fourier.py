@@ -0,0 +1,133 @@
+import collections
+import hashlib
+import threading
+
+import numpy as np
+
+EPOCH = np.datetime64('1970-01-01T00:00:00', 'ns')
+NS_PER_DAY = 24 * 3600 * 10 ** 9
+
+_cache = collections.OrderedDict()
+_cache_bytes = 0
+_cache_lock = threading.Lock()  # Forecasts of several models may run in threads
+CACHE_BYTES = 2 ** 28  # Bound of the memory held by the memo, 0 disables it
+
+
+def days_since_epoch(dates):
+    """Days elapsed since 1970-01-01, as float64."""
+    ns = (np.asarray(dates, dtype='datetime64[ns]') - EPOCH).astype(np.int64)
+    # Whole days and remainder are converted separately to stay exact
+    days, remainder = np.divmod(ns, NS_PER_DAY)
+    return days + remainder / float(NS_PER_DAY)
+
+
+def _fourier_series(dates, period, series_order):
+    t = days_since_epoch(dates)
+    # Reduce the phase before scaling it, for accuracy far from the epoch
+    angle = 2.0 * np.pi * np.mod(t, period) / period
+    harmonics = np.empty((2 * series_order, len(t)))
+    if series_order:
+        harmonics[0] = np.sin(angle)
+        harmonics[1] = np.cos(angle)
+    # Higher harmonics from the angle addition formulas, without further trig
+    for i in range(1, series_order):
+        sin, cos = harmonics[2 * i - 2], harmonics[2 * i - 1]
+        harmonics[2 * i] = sin * harmonics[1] + cos * harmonics[0]
+        harmonics[2 * i + 1] = cos * harmonics[1] - sin * harmonics[0]
+    return np.ascontiguousarray(harmonics.T)
+
+
+def fourier_series(dates, period, series_order):
+    """Fourier series features `sin(2 pi k t / period)`, `cos(2 pi k t / period)`
+    for `k` from 1 to `series_order`, interleaved, with `t` in days since
+    1970-01-01.
+
+    The features are memoized on the period, order and dates, and returned
+    as a read-only contiguous float64 array. The memo holds at most
+    `CACHE_BYTES` of features, evicting the least recently used ones, and
+    larger arrays are not memoized. It is safe to call from several threads.
+
+    Parameters
+    ----------
+    dates : array-like of datetimes
+    period : float
+        Number of days of the period.
+    series_order : int
+        Number of harmonics.
+
+    Returns
+    -------
+    Matrix with seasonality features, with shape (n_dates, 2 * series_order).
+    """
+    dates = np.ascontiguousarray(dates, dtype='datetime64[ns]')
+    # Hashed in place, without copying the dates, and wide enough not to collide
+    digest = hashlib.blake2b(dates.view(np.int64), digest_size=16).digest()
+    key = (float(period), series_order, len(dates), digest)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    global _cache_bytes
+    output = _fourier_series(dates, period, series_order)
+    output.setflags(write=False)
+    if output.nbytes <= CACHE_BYTES:
+        with _cache_lock:
+            if key not in _cache:
+                _cache[key] = output
+                _cache_bytes += output.nbytes
+            while _cache_bytes > CACHE_BYTES:
+                _cache_bytes -= _cache.popitem(last=False)[1].nbytes
+    return output
+
+
+def seasonality_name(period):
+    """Name of the seasonal component of `period`, e.g. `seasonality_7` for 7 or 7.0 days."""
+    period = float(period)
+    return 'seasonality_%s' % (int(period) if period.is_integer() else period)
+
+
+def seasonality_columns(seasonality_spec):
+    """Columns of the seasonality features of each seasonal component.
+
+    Parameters
+    ----------
+    seasonality_spec : list
+        `(period, fourier_order)` of each seasonal component, see
+        `seasonality_features`.
+
+    Returns
+    -------
+    An OrderedDict mapping the name of each period (see `seasonality_name`)
+    to its list of columns, in the order in which the periods were added.
+    Components added with the same period are grouped.
+    """
+    columns = collections.OrderedDict()
+    start = 0
+    for period, fourier_order in seasonality_spec:
+        columns.setdefault(seasonality_name(period), []).extend(range(start, start + fourier_order))
+        start += fourier_order
+    return columns
+
+
+def seasonality_features(dates, seasonality_spec):
+    """Features of the seasonal components, stacked in a contiguous matrix.
+
+    Parameters
+    ----------
+    dates : array-like of datetimes
+    seasonality_spec : list
+        `(period, fourier_order)` of each seasonal component, each one using
+        the first `fourier_order` Fourier features of its period.
+
+    Returns
+    -------
+    Matrix with shape (n_dates, sum of the Fourier orders).
+    """
+    columns = [
+        fourier_series(dates, period, (fourier_order + 1) // 2)[:, :fourier_order]
+        for period, fourier_order in seasonality_spec
+    ]
+    if not columns:
+        return np.empty((len(dates), 0))
+    return np.ascontiguousarray(np.hstack(columns))
@@ -1,9 +1,46 @@
-import math
+import json
 
+import matplotlib.figure
 import matplotlib.pylab as plt
 import numpy as np
 import pandas as pd
 import pymc3 as pm
+import scipy.linalg
+import scipy.sparse
+import theano
+import theano.sparse
+import theano.tensor as tt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from . import fourier, profiling
+from .events import holiday_features, holiday_windows
+from .predictor import PMProphetPredictor, quantile_columns
+from .sources import read_columns
+from .store import load_arrays, save_arrays
+
+MAP_DRAWS = 100  # Draws of the Laplace approximation kept by the MAP fit, for the credible intervals
+
+
+class _ElboConvergence:
+    """`pm.fit` callback stopping once the ELBO reaches a plateau.
+
+    The ELBO of single iterations is too noisy, in particular on minibatches,
+    so its mean over the last `window` iterations is compared, every `window`
+    iterations, to its mean over the previous window.
+    """
+    def __init__(self, tolerance, window=500):
+        self.tolerance = tolerance
+        self.window = window
+        self.iteration = None  # Iteration at which the ELBO converged
+
+    def __call__(self, approx, loss_history, iteration):
+        if len(loss_history) % self.window or len(loss_history) < 2 * self.window:
+            return
+        current = np.mean(loss_history[-self.window:])
+        previous = np.mean(loss_history[-2 * self.window:-self.window])
+        if np.abs(current - previous) < self.tolerance * np.abs(previous):
+            self.iteration = iteration
+            raise StopIteration("ELBO converged at iteration %d" % iteration)
 
 
 class PMProphet:
@@ -11,8 +48,12 @@ class PMProphet:
 
     Parameters
     ----------
-    data : pd.DataFrame (with 'y' and 'ds' columns)
-        Data to be used for fitting the model.
+    data : pd.DataFrame (with 'y' and 'ds' columns), or column source
+        Data to be used for fitting the model. Other than a pd.DataFrame,
+        which is copied, any source accepted by `sources.read_columns`: a dict
+        of arrays, an Arrow table, a Parquet or CSV path or an iterable of
+        chunks. Its `ds`, `y` and `columns` are converted once into compact
+        arrays, without intermediate copies.
     growth : bool
         Include the growth component.
     intercept : bool
@@ -25,13 +66,41 @@ class PMProphet:
         List of dates at which to include potential changepoints.
     n_changepoints : int
         Number of potential changepoints to include.
+    vectorize : bool
+        Stack seasonality, holidays and regressors in a single feature matrix
+        per component and compute their contribution with one dot product,
+        instead of adding one term per column to the model graph.
+    store_components : bool
+        Track the fitted `y`, seasonality, regressors and holidays of every
+        draw in the trace (`y_hat_*`, `seasonality_hat_*`, ...). If False, they
+        are not stored and `component_draws` computes them when needed.
+    profile : bool or profiling.Profile
+        Record the duration, memory and metrics of each phase of the fits and
+        forecasts in `profile.records`. Pass a `profiling.Profile` to set a
+        callback receiving each record, or to trace the memory allocations.
+    dtype : 'float64' or 'float32'
+        Precision of the features, of the model (as the Theano `floatX`), of
+        its trace and of the predictions. 'float32' halves the memory and the
+        bandwidth of the large (dates x draws) arrays.
+    columns : list
+        Columns of a column source to read besides `ds` and `y`, e.g. the
+        regressors. Other columns, such as a series identifier, are skipped.
+    chunksize : int
+        Number of rows of the chunks in which Parquet and CSV files are read.
     """
-    def __init__(self, data, growth=False, intercept=True, model=None, name=None, changepoints=[], n_changepoints=0):
-        self.data = data.copy()
-        self.data['ds'] = pd.to_datetime(arg=self.data['ds'])
-        self.data.index = range(len(self.data))
+    def __init__(self, data, growth=False, intercept=True, model=None, name=None, changepoints=[], n_changepoints=0,
+                 vectorize=True, store_components=True, profile=False, dtype='float64', columns=None,
+                 chunksize=10 ** 6):
+        if isinstance(data, pd.DataFrame):
+            self.data = data.copy()
+            self.data['ds'] = pd.to_datetime(arg=self.data['ds'])
+            self.data.index = range(len(self.data))
+        else:
+            self.data = pd.DataFrame(read_columns(data, columns or [], chunksize=chunksize), copy=False)
         self.seasonality = []
+        self.seasonality_spec = []
         self.holidays = []
+        self.holiday_spec = []
         self.regressors = []
         self.model = pm.Model() if model is None else model
         self.intercept = intercept
@@ -40,17 +109,28 @@ class PMProphet:
         self.params = {}
         self.trace = {}
         self.start = {}
+        self.predictor = None
+        self.shared = {}
+        self.y_scale = None
+        self.batch_rows = None
+        self.elbo_history = None
         self.changepoints = pd.DatetimeIndex(changepoints)
         self.name = name
+        self.vectorize = vectorize
+        self.store_components = store_components
+        self.profile = profiling.Profile() if profile is True else (profile or None)
+        self.dtype = np.dtype(dtype)
 
         if changepoints and n_changepoints:
             raise Exception("You can either specify a list of changepoint dates of a number of them")
-        if 'y' not in data.columns:
+        if 'y' not in self.data.columns:
             raise Exception("Target variable should be called `y` in the `data` dataframe")
-        if 'ds' not in data.columns:
+        if 'ds' not in self.data.columns:
             raise Exception("Time variable should be called `ds` in the `data` dataframe")
         if name is None:
             raise Exception("Specify a model name through the `name` parameter")
+        if self.dtype not in (np.float32, np.float64):
+            raise Exception("The dtype should be 'float32' or 'float64', not `%s`" % dtype)
 
         if n_changepoints:
             self.changepoints = pd.date_range(
@@ -59,6 +139,12 @@ class PMProphet:
                 periods=n_changepoints + 2
             )[1:-1]  # Exclude first and last change-point
 
+    def __getstate__(self):
+        # The compiled predictor is rebuilt on demand
+        state = self.__dict__.copy()
+        state['predictor'] = None
+        return state
+
     @staticmethod
     def fourier_series(dates, period, series_order):
         """Provides Fourier series components with the specified frequency
@@ -77,20 +163,14 @@ class PMProphet:
         -------
         Matrix with seasonality features.
         """
-        t = np.array(
-            (dates - pd.datetime(1970, 1, 1))
-                .dt.total_seconds()
-                .astype(np.float)
-        ) / (3600 * 24.)
-        return np.column_stack([
-            fun((2.0 * (i + 1) * np.pi * t / period))
-            for i in range(series_order)
-            for fun in (np.sin, np.cos)
-        ])
+        return fourier.fourier_series(dates, period, series_order)
 
     def add_seasonality(self, seasonality, fourier_order):
         """Add a seasonal component.
 
+        Its features are computed from the dates when needed, see
+        `fourier.seasonality_features`.
+
         Parameters
         ----------
         seasonality :
@@ -102,15 +182,10 @@ class PMProphet:
         The PMProphet object.
         """
         self.seasonality.extend(['f_%s_%s' % (seasonality, order_idx) for order_idx in range(fourier_order)])
-        fourier_series = PMProphet.fourier_series(
-            pd.to_datetime(self.data['ds']), seasonality, fourier_order
-        )
-        for order_idx in range(fourier_order):
-            self.data['f_%s_%s' % (seasonality, order_idx)] = fourier_series[:, order_idx]
-
+        self.seasonality_spec.append((seasonality, fourier_order))
         return self
 
-    def add_holiday(self, name, date_start, date_end):
+    def add_holiday(self, name, date_start, date_end, scale=None):
         """Add holiday features
         
         Parameters
@@ -119,13 +194,58 @@ class PMProphet:
             Name of the holiday component.
         date_start :
         date_end :
+        scale : float
+            Value of the holiday feature, defaults to the mean of `y`.
 
         Returns
         -------
         The PMProphet object.
         """
-        self.data[name] = ((self.data.ds > date_start) & (self.data.ds < date_end)).astype(int) * self.data['y'].mean()
+        # The holiday covers the dates strictly between date_start and date_end
+        one_ns = pd.Timedelta(1, unit='ns')
+        return self._add_holiday_windows(
+            name, [pd.Timestamp(date_start) + one_ns], [pd.Timestamp(date_end) - one_ns], scale
+        )
+
+    def add_holidays(self, events, scale=None):
+        """Add holidays from a table of events.
+
+        Each holiday gets a single coefficient, shared by all its events. The
+        features are stored as a sparse matrix, so that many short events
+        are cheap.
+
+        Parameters
+        ----------
+        events : pd.DataFrame
+            One row per event, with the columns `name` (of the holiday),
+            `start` and optionally `end` (the first and last date of the
+            event, `end` defaults to `start`), `lower_window` and
+            `upper_window` (number of days by which the event is extended
+            before its start and after its end, `lower_window` being
+            negative).
+        scale : float
+            Value of the holiday features, defaults to the mean of `y`.
+
+        Returns
+        -------
+        The PMProphet object.
+        """
+        for name, starts, ends in holiday_windows(events):
+            self._add_holiday_windows(name, starts, ends, scale)
+        return self
+
+    def _add_holiday_windows(self, name, starts, ends, scale=None):
+        if name in self.holidays:
+            raise Exception("Holiday `%s` already added" % name)
+        if scale is None:
+            scale = self.data['y'].mean()
         self.holidays.append(name)
+        self.holiday_spec.append((
+            name,
+            pd.DatetimeIndex(starts).values.astype('datetime64[ns]'),
+            pd.DatetimeIndex(ends).values.astype('datetime64[ns]'),
+            scale
+        ))
         return self
 
     def add_regressor(self, name, regressor=None):
@@ -141,6 +261,8 @@ class PMProphet:
         -------
         The PMProphet object.
         """
+        if not regressor and name not in self.data.columns:
+            raise Exception("Column `%s` not found in the data, read it from a source through `columns`" % name)
         self.regressors.append(name)
         if regressor:
             self.data[name] = regressor
@@ -148,7 +270,7 @@ class PMProphet:
 
     def generate_priors(self):
         """Set up the priors for the model."""
-        with self.model:
+        with self.model, self._floatx():
             if 'sigma' not in self.priors:
                 self.priors['sigma'] = pm.HalfCauchy('sigma_%s' % self.name, 10, testval=1.)
             if 'seasonality' not in self.priors and self.seasonality:
@@ -168,84 +290,410 @@ class PMProphet:
                 self.priors['intercept'] = pm.Normal('intercept_%s' % self.name, self.data['y'].mean(),
                                                      self.data['y'].std() * 2, testval=1.0)
 
-    def fit_growth(self, prior=True):
-        """Fit the growth component."""
-        s = [self.data.ix[(self.data['ds'] - i).abs().argsort()[:1]].index[0] for i in self.changepoints]
-        g = self.priors['growth'] if prior else self.trace['growth_%s' % self.name]
-
-        x = np.arange(len(self.data)) if prior else np.array([np.arange(len(self.data))] * len(g)).T
-
-        def d(i):
-            return self.priors['changepoints'][i] if prior else self.trace['changepoints_%s' % self.name][:, i]
-
-        output = x * g
-        if s:
-            output = []
-            for i in range(len(s) + 1):
-                local_growth = (g + d(i - 1) if i else 0)
-                local_x = (x - s[i - 1] if i else 0)
-                local_cond = (x > s[i - 1] if i else 0)
-                local_regression = local_growth * local_x * local_cond
-                if local_regression is 0 and not prior:
-                    output.append(np.zeros(x.shape[1]))
-                else:
-                    output.append(local_regression)
-            output = np.sum(output, axis=0)
+    def _changepoint_rows(self):
+        """Row of the first date at or after each changepoint."""
+        order = np.argsort(self.data['ds'].values, kind='mergesort')
+        s = np.searchsorted(self.data['ds'].values, self.changepoints.values, sorter=order)
+        return order[np.minimum(s, len(self.data) - 1)]
+
+    def _changepoint_matrix(self, start=0):
+        """Changepoint ramp matrix `A` (n_rows x n_changepoints), of the rows from `start`.
+
+        Column `j` is zero up to the row of the `j`-th changepoint and grows
+        linearly afterwards, so that the growth is `x * g + A @ delta`.
+        """
+        x = np.arange(start, len(self.data))
+        return np.maximum(x[:, None] - self._changepoint_rows()[None, :], 0).astype(self.dtype)
+
+    def fit_growth(self, prior=True, chunk_size=1000):
+        """Fit the growth component.
+
+        Parameters
+        ----------
+        prior : bool
+            If True, return the symbolic growth built from the priors,
+            otherwise evaluate it over the posterior draws in `self.trace`.
+        chunk_size : int
+            Number of posterior draws evaluated at once, bounds the size of
+            the intermediate arrays when `prior` is False.
 
+        Returns
+        -------
+        The growth, with shape (n_rows, n_draws) when `prior` is False.
+        """
+        x = np.arange(len(self.data), dtype=self.dtype)
+        A = self._changepoint_matrix()
+
+        if prior:
+            output = x * self.priors['growth']
+            if A.shape[1]:
+                output += tt.dot(A, self.priors['changepoints'])
+            return output
+
+        g = self.trace['growth_%s' % self.name]
+        delta = self.trace['changepoints_%s' % self.name] if A.shape[1] else None
+        output = np.empty((len(x), len(g)), dtype=self.dtype)
+        for start in range(0, len(g), chunk_size):
+            draws = slice(start, start + chunk_size)
+            np.multiply.outer(x, g[draws], out=output[:, draws])
+            if delta is not None:
+                output[:, draws] += np.dot(A, delta[draws].T)
         return output
 
-    def _prepare_fit(self):
-        self.generate_priors()
+    def component_draws(self, component='y', chunk_size=1000):
+        """Fitted values of a component for every posterior draw.
 
-        y = np.zeros(len(self.data))
-        if self.intercept:
-            y += self.priors['intercept']
+        Returns the `<component>_hat_*` Deterministic of the trace when it is
+        tracked, otherwise computes it from the parameter draws, `chunk_size`
+        draws at a time.
+
+        Parameters
+        ----------
+        component : 'y', 'seasonality', 'regressors' or 'holidays'
+            The fitted `y`, or the contribution of the component to it.
+        chunk_size : int
+            Number of posterior draws evaluated at once.
+
+        Returns
+        -------
+        The fitted values, with shape (n_draws, n_rows).
+        """
+        name = '%s_hat_%s' % (component, self.name)
+        if name in getattr(self.trace, 'varnames', self.trace):
+            return self.trace[name]
+
+        features = self._feature_arrays()
+        components = ['seasonality', 'holidays', 'regressors'] if component == 'y' else [component]
+        params = {prior: self.trace['%s_%s' % (prior, self.name)] for prior in self.priors}
+        output = np.zeros((len(params['sigma']), len(self.data)), dtype=self.dtype)
+        for start in range(0, len(output), chunk_size):
+            draws = slice(start, start + chunk_size)
+            for prior in components:
+                if prior in features:
+                    output[draws] += features[prior].dot(params[prior][draws].T).T
+            if component == 'y' and self.intercept:
+                output[draws] += params['intercept'][draws, None]
+            if component == 'y' and self.growth:
+                output[draws] += np.multiply.outer(params['growth'][draws], features['x'])
+                if 'changepoints' in features:
+                    output[draws] += params['changepoints'][draws].dot(features['changepoints'].T)
+        return output
+
+    def _feature_matrix(self, columns, sparse=False, start=0):
+        """Stack the given data columns, from row `start`, into a single feature matrix of the model dtype."""
+        features = np.ascontiguousarray(self.data[columns].values[start:], dtype=self.dtype)
+        return scipy.sparse.csr_matrix(features) if sparse else features
+
+    @staticmethod
+    def _as_variables(features, shared=False):
+        """Wrap feature arrays into Theano constants, or shared variables."""
+        variables = {}
+        for name, value in features.items():
+            if scipy.sparse.issparse(value):
+                variables[name] = theano.sparse.shared(value) if shared else theano.sparse.as_sparse_variable(value)
+            else:
+                variables[name] = theano.shared(value) if shared else tt.as_tensor_variable(value)
+        return variables
+
+    def _feature_arrays(self, start=0):
+        """Time index, changepoint ramps and stacked features of the linear components, of the rows from `start`."""
+        ds = self.data['ds'].values[start:]
+        features = {'x': np.arange(start, len(self.data), dtype=self.dtype)}
+        if self.growth and len(self.changepoints):
+            features['changepoints'] = self._changepoint_matrix(start)
+        if self.seasonality:
+            # Computed in float64, for the accuracy of the phase, then cast
+            features['seasonality'] = fourier.seasonality_features(ds, self.seasonality_spec).astype(
+                self.dtype, copy=False
+            )
+        if self.holidays:
+            features['holidays'] = holiday_features(ds, self.holiday_spec).astype(self.dtype, copy=False)
+        if self.regressors:
+            features['regressors'] = self._feature_matrix(self.regressors, start=start)
+        return features
+
+    def _data_features(self):
+        """Features of the whole data, read from the shared variables of the model once built."""
+        if 'x' not in self.shared:
+            return self._feature_arrays()
+        return {name: value.get_value(borrow=True) for name, value in self.shared.items() if name not in ('y', 'mask')}
+
+    def _components(self, features, params):
+        """Contribution of each component to the mean of the model.
+
+        This is the expression used both for fitting and for predicting.
+
+        Parameters
+        ----------
+        features : dict
+            Theano variables of the features returned by `_feature_arrays`.
+        params : dict
+            Theano variables of the parameters, with the draws on the first
+            axis.
 
+        Returns
+        -------
+        A dict with the contribution of each component, with shape
+        (n_rows, n_draws).
+        """
+        components = {}
+        if self.intercept:
+            components['intercept'] = params['intercept'].dimshuffle('x', 0)
         if self.growth:
-            y += self.fit_growth()
-
-        regressors = np.zeros(len(self.data))
-        for idx, regressor in enumerate(self.regressors):
-            regressors += self.priors['regressors'][idx] * self.data[regressor]
-        holidays = np.zeros(len(self.data))
-        for idx, holiday in enumerate(self.holidays):
-            holidays += self.priors['holidays'][idx] * self.data[holiday]
-
-        seasonality = np.zeros(len(self.data))
-        for idx, seasonal_component in enumerate(self.seasonality):
-            seasonality += self.data[seasonal_component].values * self.priors['seasonality'][idx]
+            components['growth'] = tt.outer(features['x'], params['growth'])
+            if 'changepoints' in features:
+                components['growth'] += tt.dot(features['changepoints'], params['changepoints'].T)
+        if 'seasonality' in features:
+            components['seasonality'] = tt.dot(features['seasonality'], params['seasonality'].T)
+        if 'holidays' in features:
+            components['holidays'] = theano.sparse.structured_dot(features['holidays'], params['holidays'].T)
+        if 'regressors' in features:
+            components['regressors'] = tt.dot(features['regressors'], params['regressors'].T)
+        return components
+
+    def _minibatch(self, batch_size):
+        """Features of `batch_size` random rows, drawn anew at every evaluation."""
+        uniform = pm.tt_rng().uniform(size=(batch_size,))
+        self.batch_rows = tt.cast(uniform * self.shared['x'].shape[0], 'int64')
+        features = {}
+        for name, value in self.shared.items():
+            if isinstance(value.type, theano.sparse.SparseType):
+                features[name] = theano.sparse.get_item_list(value, self.batch_rows)
+            else:
+                features[name] = value[self.batch_rows]
+        return features
+
+    def _prepare_fit(self, batch_size=None):
+        if batch_size and not self.vectorize:
+            raise Exception("Fitting on minibatches requires `vectorize=True`")
+        with profiling.phase(self.profile, 'generate_priors'):
+            self.generate_priors()
+
+        with profiling.phase(self.profile, 'build_graph'):
+            self._build_graph(batch_size)
+
+    def _build_graph(self, batch_size=None):
+        if self.vectorize:
+            params = {prior: tt.shape_padleft(value) for prior, value in self.priors.items()}
+            self.shared = self._as_variables(self._feature_arrays(), shared=True)
+            features = self._minibatch(batch_size) if batch_size else self.shared
+            components = self._components(features, params)
+            # Sized on the shared data, so that rows can be appended later
+            y = regressors = holidays = seasonality = tt.zeros_like(features['x'])
+            for component, value in components.items():
+                if component == 'regressors':
+                    regressors += value[:, 0]
+                elif component == 'holidays':
+                    holidays += value[:, 0]
+                elif component == 'seasonality':
+                    seasonality += value[:, 0]
+                else:
+                    y += value[:, 0]
+        else:
+            y = np.zeros(len(self.data), dtype=self.dtype)
+            regressors = np.zeros(len(self.data), dtype=self.dtype)
+            holidays = np.zeros(len(self.data), dtype=self.dtype)
+            seasonality = np.zeros(len(self.data), dtype=self.dtype)
+            if self.intercept:
+                y += self.priors['intercept']
+            if self.growth:
+                y += self.fit_growth()
+
+            for idx, regressor in enumerate(self.regressors):
+                regressors += self.priors['regressors'][idx] * self.data[regressor].values.astype(self.dtype)
+            features = holiday_features(self.data['ds'].values, self.holiday_spec).toarray().astype(self.dtype)
+            for idx, holiday in enumerate(self.holidays):
+                holidays += self.priors['holidays'][idx] * features[:, idx]
+            features = fourier.seasonality_features(self.data['ds'].values, self.seasonality_spec).astype(self.dtype)
+            for idx, seasonal_component in enumerate(self.seasonality):
+                seasonality += features[:, idx] * self.priors['seasonality'][idx]
         # seasonality *= self.data['y'].mean()
 
-        with self.model:
-            if self.seasonality:
-                pm.Deterministic('seasonality_hat_%s' % self.name, seasonality)
-            if self.regressors:
-                pm.Deterministic('regressors_hat_%s' % self.name, regressors)
-            if self.holidays:
-                pm.Deterministic('holidays_hat_%s' % self.name, holidays)
+        if self.store_components and not batch_size:
+            with self.model:
+                if self.seasonality:
+                    pm.Deterministic('seasonality_hat_%s' % self.name, seasonality)
+                if self.regressors:
+                    pm.Deterministic('regressors_hat_%s' % self.name, regressors)
+                if self.holidays:
+                    pm.Deterministic('holidays_hat_%s' % self.name, holidays)
 
         self.y = y + regressors + holidays + seasonality
 
-    def finalize_model(self):
-        """Finalize the model."""
-        self._prepare_fit()
+    def finalize_model(self, batch_size=None, mask=False):
+        """Finalize the model.
+
+        Parameters
+        ----------
+        batch_size : int
+            If given, the likelihood is evaluated on a random batch of rows,
+            drawn anew at every evaluation, and scaled to the whole data.
+        mask : bool
+            Weight the likelihood of each row by the shared variable
+            `shared['mask']`, initially all ones, so that rows can be left out
+            of the fit without rebuilding and recompiling the model.
+        """
+        if batch_size and mask:
+            raise Exception("Minibatches and masks cannot be combined")
+        with self._floatx():
+            self._prepare_fit(batch_size)
+            with profiling.phase(self.profile, 'build_likelihood') as record:
+                self._build_likelihood(batch_size, mask)
+                if self.profile is not None:
+                    record['graph_nodes'] = profiling.graph_nodes(self.model.logpt)
+
+    def _floatx(self):
+        """Context building and sampling the PyMC3 model in the model dtype."""
+        return theano.change_flags(floatX=self.dtype.name)
+
+    def _build_likelihood(self, batch_size=None, mask=False):
+        # Python floats, which Theano casts to floatX, unlike NumPy scalars
+        self.y_scale = (float(self.data['y'].mean()), float(self.data['y'].std()))
+        observed = ((self.data['y'].values - self.y_scale[0]) / self.y_scale[1]).astype(self.dtype)
+        if self.vectorize:
+            self.shared['y'] = theano.shared(observed)
+            observed = self.shared['y'][self.batch_rows] if batch_size else self.shared['y']
         with self.model:
-            pm.Normal(
-                'y_%s' % self.name,
-                mu=(self.y - self.data['y'].mean()) / self.data['y'].std(),
-                sd=self.priors['sigma'],
-                observed=(self.data['y'] - self.data['y'].mean()) / self.data['y'].std()
-            )
-            pm.Deterministic('y_hat_%s' % self.name, self.y)
+            mu = (self.y - self.y_scale[0]) / self.y_scale[1]
+            if mask:
+                self.shared['mask'] = theano.shared(np.ones(len(self.data), dtype=self.dtype))
+                logp = pm.Normal.dist(mu=mu, sd=self.priors['sigma']).logp(observed)
+                pm.Potential('y_%s' % self.name, tt.sum(self.shared['mask'] * logp))
+            else:
+                pm.Normal(
+                    'y_%s' % self.name,
+                    mu=mu,
+                    sd=self.priors['sigma'],
+                    observed=observed,
+                    total_size=len(self.data) if batch_size else None
+                )
+            if self.store_components and not batch_size:
+                pm.Deterministic('y_hat_%s' % self.name, self.y)
+
+    @staticmethod
+    def _value(variable):
+        """Value of a prior parameter, only compiling a function when it is not a constant."""
+        if isinstance(variable, tt.TensorConstant):
+            value = variable.data
+        elif hasattr(variable, 'eval'):
+            try:
+                value = tt.get_scalar_constant_value(variable)
+            except tt.NotScalarConstantError:
+                value = variable.eval()
+        else:
+            value = variable
+        return np.asarray(value, dtype=np.float64)
+
+    def _gaussian_prior(self, prior, size):
+        """Mean and variance of a Normal or Laplace prior, and its Laplace scale (NaN if Normal)."""
+        distribution = getattr(self.priors[prior], 'distribution', None)
+        if isinstance(distribution, pm.Laplace):
+            scale = self._value(distribution.b)
+            variance, laplace_scale = 2 * scale ** 2, scale
+        elif isinstance(distribution, pm.Normal):
+            scale = self._value(getattr(distribution, 'sigma', getattr(distribution, 'sd', None)))
+            variance, laplace_scale = scale ** 2, np.nan
+        else:
+            raise Exception("The MAP fit only supports Normal and Laplace priors, not the `%s` prior" % prior)
+        return [np.broadcast_to(value, size) for value in (self._value(distribution.mu), variance, laplace_scale)]
+
+    def _laplace_trace(self, draws, rows=None, max_iter=100, tol=1e-8):
+        """Fit the mode of the posterior and sample its Laplace approximation.
+
+        Given sigma, the model is linear in the stacked design matrix, so the
+        mode is found by iteratively reweighted least squares: the Laplace
+        priors are replaced by Gaussians at each iteration, each step being a
+        single linear solve, and sigma by its closed-form mode.
+
+        The Laplace approximation uses the curvature of the likelihood and,
+        for the Laplace priors, of the Gaussian with the same variance.
+
+        Parameters
+        ----------
+        draws : int
+            Number of samples of the approximation, if 0 only the mode is
+            returned.
+        rows : np.array
+            Boolean mask or indices of the rows to fit, defaults to all.
 
-    def fit(self, draws=500, method='NUTS', map_initialization=False, finalize=True, step_kwargs={}, sample_kwargs={}):
+        Returns
+        -------
+        A dict with the draws of each parameter, by name, like the trace of
+        a loaded model.
+        """
+        features = self._data_features()
+        blocks = []
+        if self.intercept:
+            blocks.append(('intercept', np.ones((len(self.data), 1))))
+        if self.growth:
+            blocks.append(('growth', features['x'][:, None]))
+        for component in ('changepoints', 'seasonality', 'holidays', 'regressors'):
+            if component in features:
+                value = features[component]
+                blocks.append((component, value.toarray() if scipy.sparse.issparse(value) else value))
+
+        # Solved in float64 whatever the model dtype, the trace being cast to it
+        X = np.hstack([value for _, value in blocks]).astype(np.float64, copy=False)
+        mu, variance, laplace_scale = [np.concatenate(values) for values in zip(*[
+            self._gaussian_prior(prior, value.shape[1]) for prior, value in blocks
+        ])]
+        laplace = ~np.isnan(laplace_scale)
+
+        y = self.data['y'].values
+        y_std = self.y_scale[1] if self.y_scale else self.data['y'].std()
+        if rows is not None:
+            X, y = X[rows], y[rows]
+        XtX, Xty = X.T.dot(X), X.T.dot(y)
+        precision = 1 / variance
+        sigma = 1.
+        beta = mu
+        for _ in range(max_iter):
+            likelihood_precision = 1 / (sigma * y_std) ** 2
+            new_beta = np.linalg.solve(
+                XtX * likelihood_precision + np.diag(precision),
+                Xty * likelihood_precision + precision * mu
+            )
+            sigma = np.sqrt(np.mean(((y - X.dot(new_beta)) / y_std) ** 2))
+            converged = np.max(np.abs(new_beta - beta)) < tol * (1 + np.max(np.abs(beta)))
+            beta = new_beta
+            if converged:
+                break
+            precision = np.where(laplace, 1 / (laplace_scale * np.maximum(np.abs(beta - mu), tol)), 1 / variance)
+
+        samples = beta[None, :]
+        sigmas = np.array([sigma])
+        if draws:
+            cholesky = np.linalg.cholesky(XtX / (sigma * y_std) ** 2 + np.diag(1 / variance))
+            z = np.random.normal(size=(len(beta), draws))
+            samples = beta + scipy.linalg.solve_triangular(cholesky, z, lower=True, trans='T').T
+            sigmas = np.exp(np.random.normal(np.log(sigma), np.sqrt(1 / (2. * len(y))), size=draws))
+
+        # A plain dict of arrays, unlike a MultiTrace built from points, can be pickled
+        trace = {'sigma_%s' % self.name: sigmas.astype(self.dtype)}
+        start = 0
+        for prior, value in blocks:
+            values = samples[:, start:start + value.shape[1]]
+            if prior in ('intercept', 'growth'):
+                values = values[:, 0]
+            trace['%s_%s' % (prior, self.name)] = np.ascontiguousarray(values, dtype=self.dtype)
+            start += value.shape[1]
+        return trace
+
+    def fit(self, draws=500, method='NUTS', map_initialization=False, finalize=True, step_kwargs={}, sample_kwargs={},
+            batch_size=1000, posterior_samples=10 ** 4, tolerance=None):
         """Fit the PMProphet model.
 
         Parameters
         ----------
         draws : int, > 0
-            The number of MCMC samples.
-        method : 'NUTS' or 'Metropolis'.
+            The number of MCMC samples, of samples of the Laplace
+            approximation, or of ADVI iterations.
+        method : 'NUTS', 'Metropolis', 'MAP', 'laplace' or 'minibatch-advi'.
+            'MAP' and 'laplace' fit the mode with a closed-form solver, the
+            trace holding respectively `MAP_DRAWS` (or `draws` if fewer), or
+            `draws` samples of the Laplace approximation around it.
+            'minibatch-advi' fits the model with ADVI on random batches of
+            `batch_size` rows. Any other value fits the model with ADVI.
         map_initialization : bool
             Initialize the model with maximum a posteriori estimates.
         finalize : bool
@@ -255,33 +703,152 @@ class PMProphet:
             (`NUTS` or `Metropolis`).
         sample_kwargs : dict
             Additional arguments for the PyMC3 `sample` function.
+        batch_size : int
+            Number of rows of the batches of 'minibatch-advi'.
+        posterior_samples : int
+            Number of samples drawn from the ADVI approximation.
+        tolerance : float
+            Stop ADVI early once the mean ELBO of the last 500 iterations
+            changes by less than `tolerance` (relative, e.g. 1e-3) from the
+            mean of the previous 500. The ELBO of every iteration is kept in
+            `elbo_history`, scaled to the batch size with 'minibatch-advi'.
 
         Returns
         -------
         The fitted PMProphet object.
         """
         if finalize:
-            self.finalize_model()
+            self.finalize_model(batch_size if method == 'minibatch-advi' else None)
+
+        with self.model, self._floatx():
+            if method == 'MAP' or method == 'laplace':
+                with profiling.phase(self.profile, 'laplace'):
+                    self.trace = self._laplace_trace(draws if method == 'laplace' else min(draws, MAP_DRAWS))
+            else:
+                if map_initialization:
+                    with profiling.phase(self.profile, 'find_map'):
+                        self.start = pm.find_MAP(maxeval=10000)
+
+                if draws:
+                    if method == 'NUTS' or method == 'Metropolis':
+                        with profiling.phase(self.profile, 'compile') as record:
+                            step = pm.Metropolis(**step_kwargs) if method == 'Metropolis' else pm.NUTS(**step_kwargs)
+                            if self.profile is not None:
+                                record['compiled_nodes'] = profiling.step_nodes(step)
+                        self.trace = self._sample(
+                            draws,
+                            step=step,
+                            start=self.start if map_initialization else None,
+                            **sample_kwargs
+                        )
+                    else:
+                        callbacks = [_ElboConvergence(tolerance)] if tolerance else []
+                        with profiling.phase(self.profile, 'advi') as record:
+                            res = pm.fit(draws, start=self.start if map_initialization else None,
+                                         callbacks=callbacks)
+                            self.elbo_history = -res.hist
+                            self.trace = res.sample(posterior_samples)
+                            record.update(iterations=len(res.hist), elbo=float(self.elbo_history[-1]))
 
-        with self.model:
-            if map_initialization:
-                self.start = pm.find_MAP(maxeval=10000)
-
-            if draws:
-                if method == 'NUTS' or method == 'Metropolis':
-                    self.trace = pm.sample(
-                        draws,
-                        step=pm.Metropolis(**step_kwargs) if method == 'Metropolis' else pm.NUTS(**step_kwargs),
-                        start=self.start if map_initialization else None,
-                        **sample_kwargs
-                    )
-                else:
-                    res = pm.fit(draws, start=self.start if map_initialization else None)
-                    self.trace = res.sample(10 ** 4)
-        
         return self
 
-    def predict(self, forecasting_periods=10, freq='D', extra_data=None, include_history=True, alpha=0.05, plot=False):
+    def _sample(self, draws, **kwargs):
+        if self.profile is None:
+            return pm.sample(draws, **kwargs)
+        return self.profile.sample(draws, **kwargs)
+
+    def _warm_step(self, step_kwargs):
+        """NUTS step adapted from the current trace.
+
+        The mass matrix starts from the variance of the draws and the step
+        size from its value at the end of tuning.
+        """
+        if 'step_size' not in getattr(self.trace, 'stat_names', ()):
+            raise Exception("Warm-starting the sampler requires a model fitted with NUTS")
+        variables = pm.inputvars(self.model.cont_vars)
+        samples = np.hstack([
+            self.trace[variable.name].reshape((len(self.trace[variable.name]), -1)) for variable in variables
+        ])
+        potential = pm.step_methods.hmc.quadpotential.QuadPotentialDiagAdapt(
+            samples.shape[1], samples.mean(axis=0), samples.var(axis=0), 10
+        )
+        step_size = np.mean([
+            stats[-1] for stats in self.trace.get_sampler_stats('step_size', combine=False, squeeze=False)
+        ])
+        # The test values stored in the graph were computed on the previous data
+        with theano.change_flags(compute_test_value='off'):
+            return pm.NUTS(vars=variables, potential=potential, step_scale=step_size * samples.shape[1] ** 0.25,
+                           **step_kwargs)
+
+    def update(self, new_rows, draws=200, tune=200, method='NUTS', step_kwargs={}, sample_kwargs={}):
+        """Append new observations and refit, warm-starting from the current fit.
+
+        The model graph is reused through its shared variables and only the
+        features of the new rows are computed. With NUTS, sampling starts from
+        the last draw of the current trace, with its step size and a mass
+        matrix estimated from its draws, so that short `tune` and `draws`
+        budgets are enough. The scaling of `y` is kept from the first fit.
+
+        Parameters
+        ----------
+        new_rows : pd.DataFrame (with 'y', 'ds' and the regressors columns)
+            Observations following the current data.
+        draws : int, > 0
+            The number of MCMC samples.
+        tune : int
+            The number of tuning steps.
+        method : 'NUTS', 'MAP' or 'laplace'.
+        step_kwargs : dict
+            Additional arguments for `NUTS`.
+        sample_kwargs : dict
+            Additional arguments for the PyMC3 `sample` function.
+
+        Returns
+        -------
+        The updated PMProphet object.
+        """
+        if 'y' not in self.shared:
+            raise Exception("Only models fitted with `vectorize=True` can be updated")
+        if self.batch_rows is not None:
+            raise Exception("Models fitted on minibatches cannot be updated")
+
+        rows = pd.DataFrame({'ds': pd.to_datetime(new_rows['ds']).values, 'y': new_rows['y'].values})
+        for regressor in self.regressors:
+            rows[regressor] = new_rows[regressor].values
+        start = len(self.data)
+        # Columns that are not used by the model are left missing in the new rows
+        self.data = pd.concat([self.data, rows.reindex(columns=self.data.columns)], ignore_index=True)
+
+        # Only the features of the new rows are computed, and appended to the current ones
+        features = self._feature_arrays(start)
+        features['y'] = ((rows['y'].values - self.y_scale[0]) / self.y_scale[1]).astype(self.dtype)
+        for name, value in features.items():
+            current = self.shared[name].get_value(borrow=True)
+            if scipy.sparse.issparse(value):
+                self.shared[name].set_value(scipy.sparse.vstack([current, value], format='csr'))
+            else:
+                self.shared[name].set_value(np.concatenate([current, value]))
+
+        with self.model, self._floatx():
+            if method == 'MAP' or method == 'laplace':
+                with profiling.phase(self.profile, 'laplace'):
+                    self.trace = self._laplace_trace(draws if method == 'laplace' else min(draws, MAP_DRAWS))
+            else:
+                start = {variable.name: self.trace[variable.name][-1] for variable in self.model.free_RVs}
+                with profiling.phase(self.profile, 'compile') as record:
+                    step = self._warm_step(step_kwargs)
+                    if self.profile is not None:
+                        record['compiled_nodes'] = profiling.step_nodes(step)
+                self.trace = self._sample(draws, tune=tune, step=step, start=start, **sample_kwargs)
+
+        # The compiled predictor, if any, is kept; otherwise predict builds it
+        if self.predictor is not None:
+            self.predictor.load(self)
+
+        return self
+
+    def predict(self, forecasting_periods=10, freq='D', extra_data=None, include_history=True, alpha=0.05, plot=False,
+                chunk_size=None, max_memory=2 ** 28, quantiles=None, components=False, random_state=None, ax=None):
         """Predict using the PMProphet model.
 
         Parameters
@@ -289,123 +856,264 @@ class PMProphet:
         forecasting_periods :
         freq : string, default: 'D'
         extra_data : pd.DataFrame
+            Future values of the regressors, matched on `ds` if present,
+            otherwise the last `forecasting_periods` rows are used.
         include_history : bool
             If True, predictions are concatenated to the data.
-        alpha : float
-            Width of the the credible intervals.
+        alpha : float or list of floats
+            Width of the credible intervals, bounded by the `y_low` and
+            `y_high` columns, or `y_low_<alpha>` and `y_high_<alpha>` for a
+            list.
         plot : bool
-            Plot the predictions.
+            Plot the predictions (with the first credible interval).
+        chunk_size : int
+            Number of dates for which the posterior draws are evaluated at
+            once. If None, it is derived from `max_memory`.
+        max_memory : int
+            Approximate upper bound, in bytes, of the memory used by the
+            intermediate (dates x draws) arrays.
+        quantiles : list of floats
+            Additional quantiles, in [0, 1], in the `y_p<percent>` columns
+            (e.g. `y_p5` for 0.05). Like the credible intervals, they include
+            the observation noise.
+        components : bool or list
+            Also forecast the median, credible intervals and quantiles of the
+            components, `trend` (intercept and growth), `seasonality_<period>`,
+            `holidays` and `regressors`, or of the given ones, in the
+            `<component>_hat`, `<component>_low`, ... columns.
+        random_state : None, int or np.random.Generator
+            Source of the observation noise, the global NumPy random state if
+            None.
+        ax : matplotlib Axes
+            Axes on which to plot the predictions, even if `plot` is False.
+            If None, `plot` draws them on a new pyplot figure, which is shown.
 
         Returns
         -------
         A pd.DataFrame with the forecast components.
         """
-        last_date = self.data['ds'].max()
-        dates = pd.date_range(
-            start=last_date,
-            periods=forecasting_periods + 1,  # An extra in case we include start
-            freq=freq)
-        dates = dates[dates > last_date]  # Drop start if equals last_date
-        dates = dates[:forecasting_periods]  # Return correct number of periods
-
-        new_df = pd.DataFrame()
-
-        if include_history:
-            new_df['y'] = np.concatenate([self.data['y'], np.zeros(forecasting_periods) * np.nan])
-            new_df['ds'] = np.concatenate([self.data['ds'], dates])
-        else:
-            new_df['y'] = np.zeros(forecasting_periods)
-            new_df['ds'] = dates
-
-        if extra_data is not None:
-            for column in extra_data.columns:
-                if column not in ['y', 'ds']:
-                    new_df[column] = extra_data[column]
-
-        m = PMProphet(
-            data=new_df,
-            growth=self.growth,
-            intercept=self.intercept,
-            model=self.model,
-            name=self.name
+        if self.predictor is None or self.predictor.trace is not self.trace:
+            self.predictor = PMProphetPredictor(self)
+
+        ddf = self.predictor.predict(
+            forecasting_periods=forecasting_periods,
+            freq=freq,
+            extra_data=extra_data,
+            include_history=include_history,
+            alpha=alpha,
+            chunk_size=chunk_size,
+            max_memory=max_memory,
+            quantiles=quantiles,
+            components=components,
+            random_state=random_state
         )
 
-        m.changepoints = self.changepoints
-
-        periods = {}
-        for column in self.data.columns:
-            if column.startswith("f_"):
-                period, order = column[2:].split("_")
-                periods.setdefault(period, [])
-                periods[period].append(int(order))
-
-        for period, orders in periods.items():
-            m.add_seasonality(seasonality=float(period), fourier_order=max(orders) + 1)
-
-        m.priors = self.priors
-        m.trace = self.trace
-
-        # Start with the trend
-        y_hat = m.fit_growth(prior=False)
-
-        # Add seasonality
-        y_hat += m.fit_seasonality(flatten_components=True)
-
-        # Add intercept
-        y_hat += self.trace['intercept_%s' % self.name]
-
-        y_hat_noised = y_hat + np.random.normal(0, self.trace['sigma_%s' % self.name])
-
-        ddf = pd.DataFrame(
-            [
-                np.percentile(y_hat, 50, axis=-1),
-                np.percentile(y_hat_noised, math.ceil(100 - (100 * alpha / 2)), axis=-1),
-                np.percentile(y_hat_noised, math.floor(100 * alpha / 2), axis=-1),
-            ]
-        ).T
-        ddf['ds'] = m.data['ds']
-        ddf.columns = ['y_hat', 'y_high', 'y_low', 'ds']
-
-        if plot:
-            plt.figure(figsize=(20, 10))
-            ddf.plot('ds', 'y_hat', ax=plt.gca())
-            ddf['orig_y'] = self.data['y']
-            plt.fill_between(
-                ddf['ds'].values,
-                ddf['y_low'].values.astype(float),
-                ddf['y_high'].values.astype(float),
-                alpha=.3
-            )
-
-            ddf.plot('ds', 'orig_y', style='k.', ax=plt.gca(), alpha=.2)
-            for change_point in m.changepoints:
-                plt.axvline(change_point, color='C2', lw=1, ls='dashed')
-            plt.axvline(pd.to_datetime(self.data.ds).max(), color='C3', lw=1, ls='dotted')
-            plt.show()
+        if plot or ax is not None:
+            suffix = '' if np.isscalar(alpha) else '_%g' % alpha[0]
+            if ax is None:
+                self._draw_forecast(plt.figure(figsize=(20, 10)).gca(), ddf, suffix)
+                plt.show()
+            else:
+                self._draw_forecast(ax, ddf, suffix)
 
         return ddf
 
-    def make_trend(self, alpha):
+    def save(self, path, dtype=None):
+        """Save the fitted model for prediction.
+
+        Only the draws of the parameters are stored, not the per-draw
+        Deterministics of the trace, together with the data needed to rebuild
+        the features: dates, `y`, regressors, changepoints, seasonality and
+        holidays specifications and scaling. Everything goes in a single
+        uncompressed `.npz` file, that `PMProphet.load` memory-maps.
+
+        Parameters
+        ----------
+        path : string
+            Destination, the `.npz` extension is appended if missing.
+        dtype : numpy dtype
+            Type of the stored draws, e.g. 'float32' to halve the size of the
+            file, defaults to the type of the trace.
+        """
+        if not self.trace:
+            raise Exception("Fit the model before saving it")
+
+        metadata = {
+            'name': self.name,
+            'growth': self.growth,
+            'intercept': self.intercept,
+            'vectorize': self.vectorize,
+            'seasonality': [(float(period), int(fourier_order)) for period, fourier_order in self.seasonality_spec],
+            'holidays': [(name, len(starts), float(scale)) for name, starts, _, scale in self.holiday_spec],
+            'regressors': self.regressors,
+            'priors': sorted(self.priors),
+            'y_scale': self.y_scale,
+            'dtype': self.dtype.name,
+        }
+        arrays = {
+            'metadata': np.array(json.dumps(metadata)),
+            'ds': self.data['ds'].values.astype('datetime64[ns]').view(np.int64),
+            'y': self.data['y'].values.astype(np.float64),
+            'regressors': np.ascontiguousarray(self.data[self.regressors].values, dtype=np.float64),
+            'changepoints': self.changepoints.values.astype('datetime64[ns]').view(np.int64),
+            'holiday_starts': np.concatenate([np.empty(0, dtype=np.int64)] + [
+                starts.view(np.int64) for _, starts, _, _ in self.holiday_spec
+            ]),
+            'holiday_ends': np.concatenate([np.empty(0, dtype=np.int64)] + [
+                ends.view(np.int64) for _, _, ends, _ in self.holiday_spec
+            ]),
+        }
+        for prior in self.priors:
+            draws = self.trace['%s_%s' % (prior, self.name)]
+            arrays['trace_%s' % prior] = draws if dtype is None else draws.astype(dtype)
+        save_arrays(path, arrays)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Load a model saved with `PMProphet.save`.
+
+        The loaded model can predict, but not be fitted or updated, since
+        its PyMC3 model is not rebuilt.
+
+        Parameters
+        ----------
+        path : string
+            Path of the `.npz` file.
+        mmap : bool
+            Memory-map the draws, read-only, instead of reading them in
+            memory, so that loading is immediate and the pages are shared by
+            the processes loading the same file.
+
+        Returns
+        -------
+        The PMProphet object.
+        """
+        arrays = load_arrays(path, mmap=mmap)
+        metadata = json.loads(str(arrays['metadata']))
+
+        data = {'ds': arrays['ds'].view('datetime64[ns]'), 'y': arrays['y']}
+        for idx, regressor in enumerate(metadata['regressors']):
+            data[regressor] = arrays['regressors'][:, idx]
+
+        model = cls(
+            data,
+            growth=metadata['growth'],
+            intercept=metadata['intercept'],
+            name=metadata['name'],
+            changepoints=list(arrays['changepoints'].view('datetime64[ns]')),
+            vectorize=metadata['vectorize'],
+            dtype=metadata.get('dtype', 'float64'),
+            columns=metadata['regressors'],
+        )
+        for seasonality, fourier_order in metadata['seasonality']:
+            model.add_seasonality(seasonality, fourier_order)
+        start = 0
+        for name, n_events, scale in metadata['holidays']:
+            events = slice(start, start + n_events)
+            model._add_holiday_windows(name, arrays['holiday_starts'][events].view('datetime64[ns]'),
+                                       arrays['holiday_ends'][events].view('datetime64[ns]'), scale)
+            start += n_events
+        for regressor in metadata['regressors']:
+            model.add_regressor(regressor)
+        model.y_scale = tuple(metadata['y_scale']) if metadata['y_scale'] else None
+
+        model.priors = {prior: None for prior in metadata['priors']}
+        model.trace = {
+            '%s_%s' % (prior, model.name): arrays['trace_%s' % prior] for prior in metadata['priors']
+        }
+        return model
+
+    def make_trend(self, alpha, quantiles=None):
+        """Posterior mean and credible interval of the growth.
+
+        Parameters
+        ----------
+        alpha : float
+            Width of the credible interval.
+        quantiles : list of floats
+            Additional quantiles, in [0, 1], in the `y_p<percent>` columns.
+
+        Returns
+        -------
+        A pd.DataFrame with the `ds`, `y`, `y_mid`, `y_low` and `y_high`
+        columns, and the quantiles.
+        """
         fitted_growth = self.fit_growth(prior=False)
-        ddf = pd.DataFrame(
-            [
-                self.data['ds'].astype(str),
-                self.data['y'],
-                np.mean(fitted_growth, axis=-1),
-                np.percentile(fitted_growth, math.floor(alpha * 100 / 2), axis=-1),
-                np.percentile(fitted_growth, math.ceil(100 - alpha * 100 / 2), axis=-1),
-            ]).T
-
-        ddf.columns = ['ds', 'y', 'y_mid', 'y_low', 'y_high']
-        ddf.loc[:, 'ds'] = pd.to_datetime(ddf['ds'])
-        return ddf
+        names, probabilities = quantile_columns(alpha, quantiles)
+        # The bounds and quantiles are computed in a single partition of the draws
+        values = np.quantile(fitted_growth, probabilities, axis=-1)
+        ddf = pd.DataFrame({
+            'ds': pd.to_datetime(self.data['ds'].values),
+            'y': self.data['y'].values,
+            'y_mid': np.mean(fitted_growth, axis=-1),
+        })
+        for name, value in zip(names, values):
+            ddf['y_%s' % name] = value
+        return ddf[['ds', 'y', 'y_mid', 'y_low', 'y_high'] + ['y_%s' % name for name in names[2:]]]
+
+    def component_summaries(self, alpha=0.05, seasonality=True, growth=True, regressors=True, intercept=True,
+                            changepoints=True):
+        """Posterior median and credible interval of the components.
+
+        Each summary is computed once from the draws of the parameters, so
+        that the components can be drawn, or rendered for many models,
+        without evaluating the posterior again.
+
+        Parameters
+        ----------
+        alpha : float
+            Width of the credible intervals.
+        seasonality, growth, regressors, intercept, changepoints : bool
+            Summarize the component, if the model has it.
+
+        Returns
+        -------
+        A dict of pd.DataFrames with the `y_mid`, `y_low` and `y_high` columns:
+        `seasonality_<period>` over the first period of the data and `growth`
+        over the data, with their `ds`, and the `intercept`, `regressors` and
+        `changepoints` parameters, with their `name`.
+        """
+        names, probabilities = quantile_columns(alpha, [0.5])
+        summaries = {}
+
+        def summary(values, **columns):
+            ddf = pd.DataFrame(columns)
+            for name, value in zip(names, np.quantile(values, probabilities, axis=-1)):
+                ddf['y_%s' % name] = value
+            return ddf.rename(columns={'y_p50': 'y_mid'})[list(columns) + ['y_mid', 'y_low', 'y_high']]
+
+        if seasonality and self.seasonality:
+            rows = min(int(max(period for period, _ in self.seasonality_spec)), len(self.data))
+            ds = pd.to_datetime(self.data['ds'].values[:rows])
+            features = fourier.seasonality_features(ds.values, self.seasonality_spec)
+            draws = self.trace['seasonality_%s' % self.name]
+            periods = {fourier.seasonality_name(period): period for period, _ in self.seasonality_spec}
+            for name, idx in fourier.seasonality_columns(self.seasonality_spec).items():
+                head = slice(0, int(periods[name]))
+                summaries[name] = summary(features[head, idx].dot(draws[:, idx].T), ds=ds[head])
+        if growth and self.growth:
+            summaries['growth'] = summary(self.fit_growth(prior=False), ds=pd.to_datetime(self.data['ds'].values))
+        if intercept and self.intercept:
+            summaries['intercept'] = summary(
+                np.reshape(self.trace['intercept_%s' % self.name], (1, -1)), name=['Intercept']
+            )
+        if regressors and self.regressors:
+            summaries['regressors'] = summary(self.trace['regressors_%s' % self.name].T, name=self.regressors)
+        if changepoints and self.growth and len(self.changepoints):
+            summaries['changepoints'] = summary(
+                self.trace['changepoints_%s' % self.name].T, name=self.changepoints.strftime('%Y-%m-%d')
+            )
+        return summaries
 
     def plot_components(self, seasonality=True, growth=True, regressors=True, intercept=True, changepoints=True,
-                        plt_kwargs={}, alpha=0.05):
+                        plt_kwargs={}, alpha=0.05, fig=None, path=None, format=None, dpi=None):
         """Plot the PMProphet forecast components.
 
-        Will plot whichever are available of: trend, holidays, weekly
-        seasonality, and yearly seasonality.
+        Will plot whichever are available of: seasonality, growth, intercept,
+        regressors and changepoints, on a single grid of subplots, from the
+        summaries of `component_summaries`. The figure is not shown: with a
+        `path`, it is rendered with the Agg backend, without pyplot, so that
+        it can run headless and in parallel.
 
         Parameters
         ----------
@@ -420,131 +1128,115 @@ class PMProphet:
         changepoints : bool
             Plot changepoints if feasible.
         plt_kwargs : dict
-            Additional arguments passed to plotting functions.
+            Additional arguments for the new figure.
         alpha : float
-            Width of the the credible intervals.
+            Width of the credible intervals.
+        fig : matplotlib.figure.Figure
+            Figure to reuse, cleared before drawing.
+        path : string or file-like object
+            Save the figure to this file.
+        format : string
+            Format of the file, e.g. 'png' or 'svg', inferred from `path` if
+            None.
+        dpi : float
+            Resolution of the file.
 
         Returns
         -------
         A matplotlib figure.
         """
-        if not plt_kwargs:
-            plt_kwargs = {'figsize': (20, 10)}
-
-        if seasonality and self.seasonality:
-            self._plot_seasonality(alpha, plt_kwargs)
-        if growth and self.growth:
-            self._plot_growth(alpha, plt_kwargs)
-        if intercept and self.intercept:
-            self._plot_intercept(alpha, plt_kwargs)
-        if regressors and self.regressors:
-            self._plot_regressors(alpha, plt_kwargs)
-        if changepoints and len(self.changepoints):
-            self._plot_changepoints(alpha, plt_kwargs)
-
-    def _plot_growth(self, alpha, plot_kwargs):
-        ddf = self.make_trend(alpha)
-        g = self.fit_growth(prior=False)
-        ddf['growth_mid'] = np.percentile(g, 50, axis=-1)
-        ddf['growth_low'] = np.percentile(g, 98, axis=-1)
-        ddf['growth_high'] = np.percentile(g, 2, axis=-1)
-        plt.figure(**plot_kwargs)
-        ddf.plot(x='ds', y='growth_mid', ax=plt.gca())
-        plt.title("Model Growth")
-        plt.fill_between(
+        summaries = self.component_summaries(alpha, seasonality, growth, regressors, intercept, changepoints)
+        if not summaries:
+            raise Exception("The model has no component to plot")
+
+        if fig is None:
+            plt_kwargs = dict({'figsize': (20, 5 * len(summaries))}, **plt_kwargs)
+            if path is None:
+                fig = plt.figure(**plt_kwargs)
+            else:
+                fig = matplotlib.figure.Figure(**plt_kwargs)
+                FigureCanvasAgg(fig)
+        else:
+            fig.clear()
+
+        axes = fig.subplots(len(summaries), 1, squeeze=False)[:, 0]
+        for ax, (component, ddf) in zip(axes, summaries.items()):
+            if component == 'growth':
+                self._draw_growth(ax, ddf)
+            elif component.startswith('seasonality'):
+                self._draw_seasonality(ax, ddf, component.split('_')[1])
+            else:
+                self._draw_parameters(ax, ddf, component)
+        fig.tight_layout()
+
+        if path is not None:
+            fig.savefig(path, format=format, dpi=dpi)
+        return fig
+
+    def _draw_forecast(self, ax, ddf, suffix=''):
+        ax.plot(ddf['ds'], ddf['y_hat'], label='y_hat')
+        ax.fill_between(
             ddf['ds'].values,
-            ddf['growth_low'].values.astype(float),
-            ddf['growth_high'].values.astype(float),
+            ddf['y_low' + suffix].values.astype(float),
+            ddf['y_high' + suffix].values.astype(float),
             alpha=.3
         )
+        ax.plot(self.data['ds'], self.data['y'], 'k.', alpha=.2, label='y')
         for change_point in self.changepoints:
-            plt.axvline(change_point, color='C2', lw=1, ls='dashed')
-        plt.grid()
-        plt.show()
-
-    def _plot_intercept(self, alpha, plot_kwargs):
-        plt.figure(**plot_kwargs)
-        pm.forestplot(self.trace, varnames=['intercept_%s' % self.name], ylabels="Intercept")
-        plt.show()
-
+            ax.axvline(change_point, color='C2', lw=1, ls='dashed')
+        ax.axvline(pd.to_datetime(self.data['ds']).max(), color='C3', lw=1, ls='dotted')
+        ax.legend()
 
-    @staticmethod
-    def _plot_model(ddf, plot_kwargs):
-        plt.figure(**plot_kwargs)
-        ddf.plot(ax=plt.gca(), x='ds', y='y_mid')
-        ddf.plot('ds', 'y', style='k.', ax=plt.gca())
-        plt.fill_between(
+    def _draw_growth(self, ax, ddf):
+        ax.plot(ddf['ds'], ddf['y_mid'])
+        ax.fill_between(
             ddf['ds'].values,
             ddf['y_low'].values.astype(float),
             ddf['y_high'].values.astype(float),
             alpha=.3
         )
-        plt.grid()
-        plt.title("Model")
-        plt.axes().xaxis.label.set_visible(False)
-        plt.legend(['fitted', 'observed'])
-        plt.show()
-
-    def _plot_regressors(self, alpha, plot_kwargs):
-        plt.figure(**plot_kwargs)
-        pm.forestplot(self.trace, varnames=['regressors_%s' % self.name], ylabels=self.regressors)
-        plt.show()
-
-    def fit_seasonality(self, flatten_components=False):
-        periods = list(set([float(i.split("_")[1]) for i in self.seasonality]))
-        idx = 0
-        ts = np.zeros((len(periods), len(self.data), self.trace['seasonality_%s' % self.name].shape[0]))
-        for pdx, period in enumerate(periods):
-            cols = [i for i in self.seasonality if float(i.split("_")[1]) == period]
-            for col in cols:
-                s_trace = self.trace['seasonality_%s' % self.name][:, idx]
-                ts[pdx, :] += s_trace * np.repeat([self.data[col]], len(s_trace)).reshape(len(self.data), len(s_trace))
-                idx += 1
-        return ts.sum(axis=0) if flatten_components else ts
+        for change_point in self.changepoints:
+            ax.axvline(change_point, color='C2', lw=1, ls='dashed')
+        ax.set_title("Model Growth")
+        ax.grid()
 
-    def _plot_changepoints(self, alpha, plot_kwargs):
-        plt.figure(**plot_kwargs)
-        pm.forestplot(self.trace, varnames=['changepoints_%s' % self.name], ylabels=self.changepoints.astype(str))
-        plt.grid()
-        plt.title("Growth Change Points")
-        plt.show()
-
-    def _plot_seasonality(self, alpha, plot_kwargs):
-        periods = list(set([float(i.split("_")[1]) for i in self.seasonality]))
-        ts = self.fit_seasonality()
-        ddf = pd.DataFrame(
-            np.vstack([
-                np.percentile(ts, 50, axis=-1),
-                np.percentile(ts, 2, axis=-1),
-                np.percentile(ts, 98, axis=-1)
-            ]).T,
-            columns=["%s_%s" % (p, l) for l in ['mid', 'low', 'high'] for p in periods]
+    @staticmethod
+    def _draw_seasonality(ax, ddf, period):
+        x = ddf['ds'].values
+        if float(period) == 7:
+            x = np.arange(len(ddf))
+            ax.set_xticks(x)
+            ax.set_xticklabels(ddf['ds'].dt.day_name().str[:3])
+        ax.plot(x, ddf['y_mid'], color='C0')
+        ax.fill_between(
+            x,
+            ddf['y_low'].values.astype(float),
+            ddf['y_high'].values.astype(float),
+            alpha=.3,
         )
-        ddf['ds'] = self.data['ds']
-        for period in periods:
-            graph = ddf.head(int(period))
-            if period == 7:
-                graph.loc[:, 'ds'] = [str(i[:3]) for i in graph['ds'].dt.weekday_name]
-            plt.figure(**plot_kwargs)
-            graph.plot(
-                y="%s_mid" % period,
-                x='ds',
-                color='C0',
-                legend=False,
-                ax=plt.gca()
-            )
-            plt.grid()
-
-            if period == 7:
-                plt.xticks(range(7), graph['ds'].values)
+        ax.set_title("Model Seasonality for period: %s days" % period)
+        ax.grid()
 
-            plt.fill_between(
-                graph['ds'].values,
-                graph["%s_low" % period].values.astype(float),
-                graph["%s_high" % period].values.astype(float),
-                alpha=.3,
-            )
+    @staticmethod
+    def _draw_parameters(ax, ddf, component):
+        y = np.arange(len(ddf))[::-1]
+        ax.errorbar(
+            ddf['y_mid'], y,
+            xerr=[ddf['y_mid'] - ddf['y_low'], ddf['y_high'] - ddf['y_mid']],
+            fmt='o', color='C0'
+        )
+        ax.set_yticks(y)
+        ax.set_yticklabels(ddf['name'])
+        if component != 'intercept':
+            ax.axvline(0, color='k', lw=1, ls='dotted')
+        ax.set_title({'changepoints': "Growth Change Points"}.get(component, component.capitalize()))
+        ax.grid()
 
-            plt.title("Model Seasonality for period: %s days" % period)
-            plt.axes().xaxis.label.set_visible(False)
-            plt.show()
+    def fit_seasonality(self, flatten_components=False):
+        columns = fourier.seasonality_columns(self.seasonality_spec)
+        draws = self.trace['seasonality_%s' % self.name]
+        ts = np.zeros((len(columns), len(self.data), draws.shape[0]), dtype=self.dtype)
+        features = fourier.seasonality_features(self.data['ds'].values, self.seasonality_spec)
+        for pdx, idx in enumerate(columns.values()):
+            ts[pdx, :] = np.dot(features[:, idx], draws[:, idx].T)
+        return ts.sum(axis=0) if flatten_components else ts
@@ -0,0 +1,150 @@
+import collections
+import concurrent.futures
+import contextlib
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+FitResult = collections.namedtuple('FitResult', ['key', 'model', 'error', 'elapsed'])
+FitResult.__doc__ = """Outcome of the fit of one series: the fitted model, or the error raised."""
+
+THREAD_VARIABLES = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS')
+
+
+@contextlib.contextmanager
+def _environ(variables):
+    """Temporarily set environment variables."""
+    previous = {name: os.environ.get(name) for name in variables}
+    os.environ.update(variables)
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def _worker_environ(compile_dir, idx, threads):
+    """Environment of the `idx`-th worker process.
+
+    It gets its own Theano compile directory under `compile_dir`, by default
+    in the temporary directory, and `threads` BLAS/OpenMP threads.
+    """
+    compile_dir = compile_dir or os.path.join(tempfile.gettempdir(), 'pmprophet')
+    flags = 'base_compiledir=%s' % os.path.join(compile_dir, 'worker-%s' % idx)
+    if os.environ.get('THEANO_FLAGS'):
+        flags = '%s,%s' % (os.environ['THEANO_FLAGS'], flags)
+    variables = {name: str(threads) for name in THREAD_VARIABLES}
+    variables['THEANO_FLAGS'] = flags
+    return variables
+
+
+def _fit(spec, fit_kwargs):
+    return spec().fit(**fit_kwargs)
+
+
+class _Worker:
+    """Single worker process, with its own environment.
+
+    Theano reads its flags when it is imported, so the environment is set
+    while the process is started by the first `submit`.
+    """
+    def __init__(self, environ, initializer=None, initargs=()):
+        self.environ = environ
+        self.executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=1, mp_context=multiprocessing.get_context('spawn'), initializer=initializer,
+            initargs=initargs
+        )
+
+    def submit(self, fn, *args):
+        with _environ(self.environ):
+            return self.executor.submit(fn, *args)
+
+    def close(self, terminate=False):
+        if terminate:
+            for process in list((self.executor._processes or {}).values()):
+                process.terminate()
+        self.executor.shutdown(wait=not terminate)
+
+
+def fit_parallel(specs, n_workers=None, threads_per_worker=1, timeout=None, compile_dir=None, fit_kwargs=None):
+    """Fit independent PMProphet models across a pool of processes.
+
+    Each worker process gets its own Theano compile directory, to avoid
+    contention on the compilation lock, and a limited number of BLAS/OpenMP
+    threads, to avoid oversubscribing the CPUs.
+
+    Parameters
+    ----------
+    specs : dict
+        Maps a key to a picklable callable, taking no arguments, returning the
+        PMProphet model to fit (e.g. a `functools.partial` of a module-level
+        function).
+    n_workers : int
+        Number of worker processes, defaults to the number of CPUs.
+    threads_per_worker : int
+        Number of BLAS/OpenMP threads of each worker.
+    timeout : float
+        Seconds after which the fit of a series is aborted and its worker
+        restarted.
+    compile_dir : string
+        Directory under which each worker gets its Theano compile directory,
+        kept across calls so that compiled modules are reused.
+    fit_kwargs : dict
+        Additional arguments for `PMProphet.fit`. Chains are sampled in the
+        worker process unless `cores` is set in `sample_kwargs`.
+
+    Yields
+    ------
+    A FitResult for each series, as soon as its fit completes, fails or times
+    out.
+    """
+    n_workers = n_workers or os.cpu_count() or 1
+    fit_kwargs = dict(fit_kwargs or {})
+    fit_kwargs['sample_kwargs'] = dict(fit_kwargs.get('sample_kwargs', {}))
+    fit_kwargs['sample_kwargs'].setdefault('cores', 1)
+
+    pending = collections.deque(specs.items())
+    workers = [None] * n_workers
+    running = {}  # future -> (key, worker index, start time)
+    try:
+        while pending or running:
+            busy = {idx for _, idx, _ in running.values()}
+            for idx in range(n_workers):
+                if pending and idx not in busy:
+                    if workers[idx] is None:
+                        workers[idx] = _Worker(_worker_environ(compile_dir, idx, threads_per_worker))
+                    key, spec = pending.popleft()
+                    running[workers[idx].submit(_fit, spec, fit_kwargs)] = (key, idx, time.time())
+
+            wait = None
+            if timeout is not None:
+                wait = max(0., min(start for _, _, start in running.values()) + timeout - time.time())
+            done, _ = concurrent.futures.wait(running, timeout=wait, return_when=concurrent.futures.FIRST_COMPLETED)
+
+            for future in done:
+                key, idx, start = running.pop(future)
+                try:
+                    yield FitResult(key, future.result(), None, time.time() - start)
+                except Exception as e:
+                    if isinstance(e, BrokenProcessPool):
+                        workers[idx].close(terminate=True)
+                        workers[idx] = None
+                    yield FitResult(key, None, e, time.time() - start)
+
+            if timeout is not None:
+                for future, (key, idx, start) in list(running.items()):
+                    if time.time() - start > timeout:
+                        del running[future]
+                        workers[idx].close(terminate=True)
+                        workers[idx] = None
+                        yield FitResult(key, None, TimeoutError("Fit timed out after %s seconds" % timeout),
+                                        time.time() - start)
+    finally:
+        for worker in workers:
+            if worker is not None:
+                worker.close(terminate=bool(running))
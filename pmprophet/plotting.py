@@ -0,0 +1,58 @@
+import concurrent.futures
+import io
+import multiprocessing
+
+from .model import PMProphet
+from .parallel import THREAD_VARIABLES, _environ
+
+
+def _render(model, path, kwargs):
+    """Render the components of a model, or of a saved model, to a file or to bytes."""
+    if isinstance(model, str):
+        model = PMProphet.load(model)
+    output = io.BytesIO() if path is None else path
+    model.plot_components(path=output, **kwargs)
+    return output.getvalue() if path is None else path
+
+
+def render_components(models, paths=None, n_workers=1, format='png', dpi=None, **kwargs):
+    """Render the components of many models, headless.
+
+    Each model is summarized once and drawn on a single figure with the Agg
+    backend, see `PMProphet.plot_components`.
+
+    Parameters
+    ----------
+    models : dict
+        Fitted PMProphet models, or paths of models saved with
+        `PMProphet.save`, by name.
+    paths : dict
+        Files where to save the figure of each model, by name. If None, the
+        figures are returned as bytes.
+    n_workers : int
+        Number of processes rendering the models, each with a single BLAS
+        thread. If 1, they are rendered in this process. The models are
+        best given as paths, loaded by the processes.
+    format : string
+        Format of the figures, e.g. 'png', 'svg' or 'pdf'.
+    dpi : float
+        Resolution of the figures.
+    kwargs :
+        Additional arguments for `PMProphet.plot_components`.
+
+    Returns
+    -------
+    A dict with the path, or the bytes, of the figure of each model, by name.
+    """
+    kwargs = dict(kwargs, format=format, dpi=dpi)
+    names = list(models)
+    args = [(models[name], None if paths is None else paths[name], kwargs) for name in names]
+
+    if n_workers == 1:
+        return {name: _render(*arg) for name, arg in zip(names, args)}
+    executor = concurrent.futures.ProcessPoolExecutor(
+        max_workers=n_workers, mp_context=multiprocessing.get_context('spawn')
+    )
+    # Workers import pyplot through the model module: keep them off any display
+    with executor, _environ(dict({name: '1' for name in THREAD_VARIABLES}, MPLBACKEND='Agg')):
+        return dict(zip(names, executor.map(_render, *zip(*args))))
@@ -0,0 +1,370 @@
+import collections
+import math
+import time
+
+import numpy as np
+import pandas as pd
+import scipy.sparse
+import theano
+import theano.tensor as tt
+
+from . import events, fourier, profiling
+
+
+def quantile_columns(alpha=0.05, quantiles=None):
+    """Suffixes and probabilities of the interval bounds and quantiles of a forecast.
+
+    Parameters
+    ----------
+    alpha : float or list of floats
+        Width of the credible intervals, bounded by the quantiles rounded
+        outwards to whole percents. The bounds are named `high` and `low`, or
+        `high_<alpha>` and `low_<alpha>` for a list.
+    quantiles : list of floats
+        Additional quantiles, in [0, 1], named `p<percent>` (e.g. `p5`).
+
+    Returns
+    -------
+    The list of suffixes and the list of probabilities.
+    """
+    intervals = [('', alpha)] if np.isscalar(alpha) else [('_%g' % value, value) for value in alpha]
+    names, probabilities = [], []
+    for suffix, value in intervals:
+        names.extend(['high' + suffix, 'low' + suffix])
+        probabilities.extend([math.ceil(100 - (100 * value / 2)) / 100., math.floor(100 * value / 2) / 100.])
+    for value in quantiles or []:
+        names.append('p%g' % (100 * value))
+        probabilities.append(value)
+    return names, probabilities
+
+
+class PMProphetPredictor:
+    """Forecaster built once from a fitted PMProphet model.
+
+    Holds the posterior samples as contiguous arrays, the features of the
+    history, in the dtype of the model, and a Theano function, compiled once
+    from the mean expression of the model, that evaluates all the draws at
+    once. The features are swapped
+    in through shared variables, so that repeated forecasts only compute the
+    features of the new dates. The components (see `component_names`) are
+    compiled in a second function when first requested. Forecasts with an
+    int seed are cached on (forecasting_periods, freq, alpha, quantiles,
+    components, include_history, seed).
+
+    Parameters
+    ----------
+    model : PMProphet
+        A fitted PMProphet model.
+    cache_size : int
+        Number of forecasts kept in the LRU cache.
+    """
+    def __init__(self, model, cache_size=32):
+        self.name = model.name
+        self.cache_size = cache_size
+        self.profile = model.profile
+        self.load(model)
+
+        with profiling.phase(self.profile, 'compile_predictor') as record:
+            self.features = model._as_variables(self.history, shared=True)
+            params = {}
+            for prior, value in self.posterior.items():
+                params[prior] = tt.TensorType(value.dtype, (False,) * value.ndim)(prior)
+                params[prior].tag.test_value = value  # PyMC3 enables compute_test_value
+            components = model._components(self.features, params)
+            mean = tt.shape_padright(tt.zeros_like(self.features['x'])) + sum(components.values())
+            self.params = sorted(params)
+            self.mean = theano.function([params[prior] for prior in self.params], mean, on_unused_input='ignore')
+            record['compiled_nodes'] = profiling.compiled_nodes(self.mean)
+
+        self._inputs = [params[prior] for prior in self.params]
+        self._total = mean
+        # Test values would evaluate every component over the whole history
+        with theano.change_flags(compute_test_value='off'):
+            self._components = self._component_graph(components, params)
+        self._component_functions = {}
+
+    def _component_graph(self, components, params):
+        """Expression of the trend, each seasonal period, the holidays and the regressors."""
+        graph = collections.OrderedDict()
+        trend = [components[component] for component in ('intercept', 'growth') if component in components]
+        if trend:
+            graph['trend'] = tt.shape_padright(tt.zeros_like(self.features['x'])) + sum(trend)
+        start = 0
+        for period, fourier_order in self.seasonality:
+            name = fourier.seasonality_name(period)
+            if len(self.seasonality) == 1:
+                graph[name] = components['seasonality']
+            else:
+                columns = slice(start, start + fourier_order)
+                value = tt.dot(self.features['seasonality'][:, columns], params['seasonality'][:, columns].T)
+                graph[name] = graph[name] + value if name in graph else value
+            start += fourier_order
+        for component in ('holidays', 'regressors'):
+            if component in components:
+                graph[component] = components[component]
+        return graph
+
+    @property
+    def component_names(self):
+        """Names of the components that can be forecast along with `y`."""
+        return list(self._components)
+
+    def _component_function(self, components):
+        """Compiled function of the total and the given components."""
+        if components not in self._component_functions:
+            with profiling.phase(self.profile, 'compile_components') as record:
+                outputs = [self._total] + [self._components[component] for component in components]
+                function = theano.function(self._inputs, outputs, on_unused_input='ignore')
+                record['compiled_nodes'] = profiling.compiled_nodes(function)
+            self._component_functions[components] = function
+        return self._component_functions[components]
+
+    def load(self, model):
+        """Load the data and the posterior samples of the model.
+
+        The compiled function is kept, so the model must have the same
+        components it was built from, e.g. after `PMProphet.update`.
+        """
+        self.trace = model.trace
+        self.dtype = model.dtype
+        self.seasonality = list(model.seasonality_spec)
+        self.holidays = list(model.holiday_spec)
+        self.regressors = list(model.regressors)
+        self.posterior = {
+            prior: np.ascontiguousarray(model.trace['%s_%s' % (prior, model.name)]) for prior in model.priors
+        }
+        self.ds = model.data['ds'].values
+        self.history = model._data_features()
+        self.changepoint_rows = model._changepoint_rows() if 'changepoints' in self.history else None
+        self._cache = collections.OrderedDict()
+
+    def future_dates(self, forecasting_periods, freq):
+        """Dates following the history."""
+        last_date = self.ds.max()
+        dates = pd.date_range(
+            start=last_date,
+            periods=forecasting_periods + 1,  # An extra in case we include start
+            freq=freq)
+        dates = dates[dates > last_date]  # Drop start if equals last_date
+        return dates[:forecasting_periods]  # Return correct number of periods
+
+    def make_seasonality_features(self, dates):
+        """Seasonality features of the given dates, in the order of the priors."""
+        return fourier.seasonality_features(dates, self.seasonality).astype(self.dtype, copy=False)
+
+    def make_holiday_features(self, dates):
+        """Sparse holiday indicators of the given dates."""
+        return events.holiday_features(dates, self.holidays).astype(self.dtype, copy=False)
+
+    def make_regressor_features(self, dates, extra_data):
+        """Regressor values of the given dates, taken from `extra_data`."""
+        if not len(dates):
+            return np.zeros((0, len(self.regressors)), dtype=self.dtype)
+        if extra_data is None:
+            raise Exception("Provide the future values of the regressors through `extra_data`")
+        if 'ds' in extra_data.columns:
+            values = extra_data.set_index(pd.to_datetime(extra_data['ds']))[self.regressors].reindex(dates)
+        else:
+            values = extra_data[self.regressors].iloc[-len(dates):]
+        values = np.ascontiguousarray(values.values, dtype=self.dtype)
+        if values.shape[0] != len(dates) or np.isnan(values).any():
+            raise Exception("Missing regressor values for the forecasted dates in `extra_data`")
+        return values
+
+    def make_features(self, dates, extra_data=None):
+        """Features of the linear components for the given future dates."""
+        features = {}
+        if self.seasonality:
+            features['seasonality'] = self.make_seasonality_features(dates)
+        if self.holidays:
+            features['holidays'] = self.make_holiday_features(dates)
+        if self.regressors:
+            features['regressors'] = self.make_regressor_features(dates, extra_data)
+        return features
+
+    def make_rows(self, forecasting_periods, freq, extra_data=None, include_history=True):
+        """Dates, time index and features of the rows of a forecast."""
+        dates = self.future_dates(forecasting_periods, freq)
+        x = np.arange(len(self.ds) + len(dates), dtype=self.dtype)
+        ds = np.concatenate([self.ds, dates.values])
+        features = self.make_features(dates, extra_data)
+        for component, value in features.items():
+            if scipy.sparse.issparse(value):
+                features[component] = scipy.sparse.vstack([self.history[component], value], format='csr')
+            else:
+                features[component] = np.vstack([self.history[component], value])
+
+        if not include_history:
+            x, ds = x[len(self.ds):], ds[len(self.ds):]
+            features = {component: value[len(self.ds):] for component, value in features.items()}
+        return ds, x, features
+
+    def posterior_mean_chunks(self, x, features, chunk_size):
+        """Evaluate the posterior mean `chunk_size` rows at a time.
+
+        Parameters
+        ----------
+        x : np.array
+            Time index of the rows (row number counted from the start of the
+            history).
+        features : dict
+            Features of the linear components of the rows.
+        chunk_size : int
+            Number of rows evaluated at once.
+
+        Yields
+        ------
+        `(rows, y_hat)` pairs, where `rows` is a slice of `x` and `y_hat` has
+        shape (n_rows, n_draws).
+        """
+        params = [self.posterior[prior] for prior in self.params]
+        for start in range(0, len(x), chunk_size):
+            rows = slice(start, start + chunk_size)
+            self._set_rows(x, features, rows)
+            yield rows, self.mean(*params)
+
+    def posterior_component_chunks(self, x, features, chunk_size, components):
+        """Evaluate the posterior mean and its components `chunk_size` rows at a time.
+
+        Same as `posterior_mean_chunks`, but yields `(rows, y_hat, values)`
+        triples, where `values` is the list of the draws of each of the
+        `components`, with the same shape as `y_hat`.
+        """
+        function = self._component_function(tuple(components))
+        params = [self.posterior[prior] for prior in self.params]
+        for start in range(0, len(x), chunk_size):
+            rows = slice(start, start + chunk_size)
+            self._set_rows(x, features, rows)
+            outputs = function(*params)
+            yield rows, outputs[0], outputs[1:]
+
+    def _set_rows(self, x, features, rows):
+        self.features['x'].set_value(x[rows])
+        if self.changepoint_rows is not None:
+            self.features['changepoints'].set_value(
+                np.maximum(x[rows, None] - self.changepoint_rows[None, :], 0).astype(self.dtype, copy=False)
+            )
+        for component, value in features.items():
+            self.features[component].set_value(value[rows])
+
+    def predict(self, forecasting_periods=10, freq='D', extra_data=None, include_history=True, alpha=0.05,
+                chunk_size=None, max_memory=2 ** 28, quantiles=None, components=False, random_state=None):
+        """Predict using the fitted model.
+
+        See `PMProphet.predict` for the description of the parameters.
+
+        Parameters
+        ----------
+        random_state : None, int or np.random.Generator
+            Source of the observation noise of the intervals and quantiles,
+            the global NumPy random state if None. Forecasts are only cached
+            for an int seed, so that every call with None draws new noise
+            from the global random state.
+
+        Returns
+        -------
+        A pd.DataFrame with the forecast components.
+        """
+        with profiling.phase(self.profile, 'predict') as record:
+            key = (forecasting_periods, freq, alpha if np.isscalar(alpha) else tuple(alpha),
+                   tuple(quantiles or ()), components if np.isscalar(components) else tuple(components),
+                   include_history, random_state)
+            # Only a seed makes the noise, and thus the forecast, reproducible
+            cacheable = extra_data is None and isinstance(random_state, (int, np.integer))
+            record['cached'] = cacheable and key in self._cache
+            if record['cached']:
+                self._cache.move_to_end(key)
+                return self._cache[key].copy()
+
+            ddf, = self._forecast([random_state], forecasting_periods, freq, extra_data, include_history, alpha,
+                                  chunk_size, max_memory, quantiles, components, record)
+
+            if cacheable:
+                self._cache[key] = ddf.copy()
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+            return ddf
+
+    def predict_many(self, random_states, forecasting_periods=10, freq='D', extra_data=None, include_history=True,
+                     alpha=0.05, chunk_size=None, max_memory=2 ** 28, quantiles=None, components=False):
+        """Forecasts differing only by their observation noise, from a single
+        evaluation of the posterior.
+
+        See `predict` for the description of the parameters.
+
+        Parameters
+        ----------
+        random_states : list
+            Source of the observation noise of each forecast, None, an int
+            seed or a np.random.Generator.
+
+        Returns
+        -------
+        A list with a pd.DataFrame per random state.
+        """
+        with profiling.phase(self.profile, 'predict') as record:
+            record['cached'] = False
+            return self._forecast(random_states, forecasting_periods, freq, extra_data, include_history, alpha,
+                                  chunk_size, max_memory, quantiles, components, record)
+
+    @staticmethod
+    def _noise(random_state, sigma):
+        # In the dtype of the draws, not to upcast the noised forecasts
+        if random_state is None:
+            return np.random.normal(0, sigma).astype(sigma.dtype, copy=False)
+        return np.random.default_rng(random_state).normal(0, sigma).astype(sigma.dtype, copy=False)
+
+    def _forecast(self, random_states, forecasting_periods, freq, extra_data, include_history, alpha, chunk_size,
+                  max_memory, quantiles, components, record):
+        if components is True:
+            components = self.component_names
+        components = tuple(components or ())
+        for component in components:
+            if component not in self._components:
+                raise Exception("Unknown component `%s`, use one of %s" % (component, self.component_names))
+        names, probabilities = quantile_columns(alpha, quantiles)
+
+        tick = time.perf_counter()
+        ds, x, features = self.make_rows(forecasting_periods, freq, extra_data, include_history)
+
+        sigma = self.posterior['sigma']
+        if chunk_size is None:
+            # y_hat, its noised version(s), the components and the temporaries of np.quantile
+            copies = 4 + 2 * len(components) + (len(random_states) > 1)
+            chunk_size = max(1, int(max_memory // (copies * sigma.itemsize * len(sigma))))
+        noises = [self._noise(random_state, sigma) for random_state in random_states]
+
+        if components:
+            chunks = self.posterior_component_chunks(x, features, chunk_size, components)
+        else:
+            chunks = ((rows, y_hat, ()) for rows, y_hat in self.posterior_mean_chunks(x, features, chunk_size))
+        # The median and the quantiles of each output are computed in a single partition of the draws
+        width = 1 + len(probabilities)
+        values = [np.empty((len(x), width * (1 + len(components)))) for _ in noises]
+        record.update(rows=len(x), chunks=0, forecasts=len(noises), features_seconds=time.perf_counter() - tick,
+                      posterior_mean_seconds=0., percentiles_seconds=0.)
+        tick = time.perf_counter()
+        for rows, y_hat, component_draws in chunks:
+            evaluated = time.perf_counter()
+            median = np.quantile(y_hat, 0.5, axis=-1)
+            component_values = [np.quantile(draws, [0.5] + probabilities, axis=-1).T for draws in component_draws]
+            for idx, (value, noise) in enumerate(zip(values, noises)):
+                value[rows, 0] = median
+                # Posterior predictive bounds, the last forecast reuses y_hat
+                noised = np.add(y_hat, noise, out=y_hat if idx == len(noises) - 1 else None)
+                value[rows, 1:width] = np.quantile(noised, probabilities, axis=-1).T
+                for jdx, component_value in enumerate(component_values, 1):
+                    value[rows, jdx * width:(jdx + 1) * width] = component_value
+            record['chunks'] += 1
+            record['posterior_mean_seconds'] += evaluated - tick
+            tick = time.perf_counter()
+            record['percentiles_seconds'] += tick - evaluated
+
+        columns = ['%s_%s' % (output, name) for output in ('y',) + components for name in ['hat'] + names]
+        forecasts = []
+        for value in values:
+            ddf = pd.DataFrame(value, columns=columns)
+            ddf['ds'] = ds
+            forecasts.append(ddf)
+        return forecasts
@@ -0,0 +1,186 @@
+import contextlib
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import numpy as np
+import pandas as pd
+import pymc3 as pm
+
+try:
+    from theano.graph.basic import ancestors
+except ImportError:  # Theano < 1.1
+    from theano.gof.graph import ancestors
+
+
+class Profile:
+    """Timing and memory profile of the phases of a fit and of the forecasts.
+
+    Each phase adds a record, a dict with its `phase` name, `start` time
+    (seconds since the epoch), duration in `seconds`, `max_rss` (peak resident
+    memory of the process so far, in bytes, None if unavailable),
+    `peak_memory` (bytes allocated at the peak of the phase above its start,
+    traced with tracemalloc, None if `memory` is False) and the metrics of the
+    phase:
+
+    - `generate_priors`, `build_graph`: construction of the priors and of the
+      mean, `build_likelihood`: of the likelihood, with the number of
+      `graph_nodes` of the log-probability.
+    - `compile`: compilation of the sampler, with its `compiled_nodes`.
+    - `tune`, `sample`: NUTS tuning and sampling, with the number of `draws`,
+      and for sampling the `divergences`, mean and max `tree_depth` and final
+      `step_size` (averaged over the chains).
+    - `find_map`, `advi` (with its `iterations` and final `elbo`), `laplace`.
+    - `compile_predictor`, with its `compiled_nodes`.
+    - `predict`, with the number of `rows`, `chunks` and `forecasts` (of
+      `predict_many`), whether it was `cached`, and the `features_seconds`,
+      `posterior_mean_seconds` and `percentiles_seconds` spent on each step.
+
+    Parameters
+    ----------
+    memory : bool
+        Trace the memory allocations of each phase. This slows down the
+        phases running much Python code, such as compilation and sampling,
+        several times.
+    callback : callable
+        Called with each record, when its phase ends.
+    """
+    def __init__(self, memory=False, callback=None):
+        self.memory = memory
+        self.callback = callback
+        self.records = []
+
+    def __getstate__(self):
+        # The callback may not be picklable, e.g. a lambda or a bound client
+        state = self.__dict__.copy()
+        state['callback'] = None
+        return state
+
+    @contextlib.contextmanager
+    def _measure(self, name):
+        record = {'phase': name, 'start': time.time()}
+        started = False
+        if self.memory:
+            started = not tracemalloc.is_tracing()
+            if started:
+                tracemalloc.start()
+            elif hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = time.perf_counter() - start
+            record['max_rss'] = max_rss()
+            record['peak_memory'] = None
+            if self.memory:
+                record['peak_memory'] = max(tracemalloc.get_traced_memory()[1] - baseline, 0)
+                if started:
+                    tracemalloc.stop()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Context manager profiling a phase, yielding its record to which
+        metrics can be added."""
+        with self._measure(name) as record:
+            yield record
+        self.add(record)
+
+    def add(self, record):
+        """Add a record, passing it to the callback."""
+        self.records.append(record)
+        if self.callback is not None:
+            self.callback(record)
+
+    def sample(self, draws, **kwargs):
+        """`pm.sample`, recording tuning and sampling as separate phases.
+
+        The time between consecutive draws, of any chain, is attributed to
+        tuning or to sampling according to the draw. The initialization of
+        the sampler is part of the tuning.
+        """
+        durations = {True: 0., False: 0.}
+        counts = {True: 0, False: 0}
+        last = [time.perf_counter()]
+        user_callback = kwargs.pop('callback', None)
+
+        def callback(trace, draw):
+            now = time.perf_counter()
+            durations[draw.tuning] += now - last[0]
+            counts[draw.tuning] += 1
+            last[0] = now
+            if user_callback is not None:
+                user_callback(trace=trace, draw=draw)
+
+        with self._measure('sample') as record:
+            trace = pm.sample(draws, callback=callback, **kwargs)
+        tuning = dict(record, phase='tune', seconds=record['seconds'] - durations[False], draws=counts[True])
+        record.update(start=record['start'] + tuning['seconds'], seconds=durations[False], draws=counts[False],
+                      **sampler_stats(trace))
+        self.add(tuning)
+        self.add(record)
+        return trace
+
+    def to_frame(self):
+        """The records as a pd.DataFrame, one row per phase."""
+        return pd.DataFrame(self.records)
+
+
+def phase(profile, name):
+    """`profile.phase(name)`, or a context doing nothing if `profile` is None."""
+    if profile is None:
+        return contextlib.nullcontext({})
+    return profile.phase(name)
+
+
+def max_rss():
+    """Peak resident memory of the process, in bytes."""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024  # kilobytes on Linux
+
+
+def graph_nodes(variable):
+    """Number of operations of the graph computing `variable`."""
+    return sum(1 for node in ancestors([variable]) if node.owner is not None)
+
+
+def compiled_nodes(function):
+    """Number of operations of a compiled Theano function, or None."""
+    maker = getattr(function, 'maker', None)
+    return len(maker.fgraph.apply_nodes) if maker is not None else None
+
+
+def step_nodes(step):
+    """Number of operations of the functions compiled by a PyMC3 step method."""
+    functions = []
+    for method in getattr(step, 'methods', [step]):  # CompoundStep
+        if hasattr(method, '_logp_dlogp_func'):  # Gradient-based methods
+            functions.append(method._logp_dlogp_func._theano_function)
+        elif hasattr(method, 'delta_logp'):  # Metropolis
+            functions.append(method.delta_logp)
+    return sum(compiled_nodes(function) or 0 for function in functions)
+
+
+def sampler_stats(trace):
+    """Divergences, tree depth and step size of a NUTS trace."""
+    stats = {}
+    names = getattr(trace, 'stat_names', ())
+    if 'diverging' in names:
+        stats['divergences'] = int(np.sum(trace.get_sampler_stats('diverging')))
+    if 'depth' in names:
+        depth = trace.get_sampler_stats('depth')
+        stats['tree_depth'] = float(np.mean(depth))
+        stats['max_tree_depth'] = int(np.max(depth))
+    if 'step_size' in names:
+        stats['step_size'] = float(np.mean([
+            values[-1] for values in trace.get_sampler_stats('step_size', combine=False, squeeze=False)
+        ]))
+    return stats
@@ -0,0 +1,220 @@
+import asyncio
+import collections
+import concurrent.futures
+import contextlib
+import threading
+
+import numpy as np
+
+from .model import PMProphet
+from .predictor import PMProphetPredictor
+
+_models = {}  # Models loaded from their path, once per process
+
+
+def _load(source):
+    if not isinstance(source, str):
+        return source
+    if source not in _models:
+        _models[source] = PMProphet.load(source)
+    return _models[source]
+
+
+def _forecast(source, seeds, kwargs):
+    """Forecasts of a model for each seed, run in the executor of the server."""
+    model = _load(source)
+    if model.predictor is None or model.predictor.trace is not model.trace:
+        model.predictor = PMProphetPredictor(model)
+    return model.predictor.predict_many([np.random.default_rng(seed) for seed in seeds], **kwargs)
+
+
+@contextlib.asynccontextmanager
+async def _unlocked():
+    yield
+
+
+class _Batch:
+    """Requests of the same forecast, evaluated together."""
+    def __init__(self):
+        self.seeds = []
+        self.futures = []
+
+
+class ForecastServer:
+    """Asynchronous forecasts of many fitted models.
+
+    The forecasts run in a bounded pool of threads, or processes, without
+    blocking the event loop. Each request draws its observation noise from
+    its own np.random.Generator, seeded by the request, rather than from the
+    global random state. Concurrent requests for the same forecast of a model
+    (horizon, frequency, intervals, quantiles and components) are coalesced:
+    the posterior is evaluated once and only the noise is drawn per request.
+    In a thread pool, the forecasts of a model run one at a time, since its
+    predictor is not thread-safe, and requests arriving meanwhile are
+    coalesced into the next evaluation. Requests with `extra_data`, the
+    future values of the regressors, are evaluated on their own.
+
+    Parameters
+    ----------
+    models : dict
+        Fitted PMProphet models, or paths of models saved with
+        `PMProphet.save`, by name.
+    max_workers : int
+        Number of threads of the default pool.
+    executor : concurrent.futures.Executor
+        Pool running the forecasts, instead of the default thread pool. With a
+        process pool, the models must be given as paths, and each process
+        loads them once, memory-mapping their draws.
+    """
+    def __init__(self, models=None, max_workers=None, executor=None):
+        self.executor = executor or concurrent.futures.ThreadPoolExecutor(max_workers, 'forecast')
+        self.models = {}
+        self.stats = collections.Counter()
+        self._own_executor = executor is None
+        self._processes = isinstance(self.executor, concurrent.futures.ProcessPoolExecutor)
+        self._locks = {}
+        self._pending = {}
+        for name, model in (models or {}).items():
+            self.add_model(name, model)
+
+    def add_model(self, name, model):
+        """Serve a fitted PMProphet model, or a model saved at the given path."""
+        if self._processes and not isinstance(model, str):
+            raise Exception("Models served by a process pool should be given as paths of saved models")
+        self.models[name] = model
+        self._locks.pop(name, None)
+
+    def remove_model(self, name):
+        """Stop serving a model."""
+        del self.models[name]
+        self._locks.pop(name, None)
+
+    async def forecast(self, model, forecasting_periods=10, freq='D', include_history=False, alpha=0.05,
+                       quantiles=None, components=False, seed=None, extra_data=None):
+        """Forecast a model.
+
+        See `PMProphet.predict` for the description of the parameters.
+
+        Parameters
+        ----------
+        model : string
+            Name of the model.
+        seed : int
+            Seed of the observation noise, drawn from fresh entropy if None.
+        extra_data : pd.DataFrame
+            Future values of the regressors, required by models with
+            regressors. Such requests are not coalesced.
+
+        Returns
+        -------
+        A pd.DataFrame with the forecast components.
+        """
+        if model not in self.models:
+            raise Exception("Unknown model `%s`" % model)
+        kwargs = dict(
+            forecasting_periods=forecasting_periods,
+            freq=freq,
+            include_history=include_history,
+            alpha=alpha if np.isscalar(alpha) else tuple(alpha),
+            quantiles=tuple(quantiles or ()),
+            components=components if np.isscalar(components) else tuple(components),
+        )
+        if extra_data is None:
+            key = (model,) + tuple(sorted(kwargs.items()))
+        else:
+            # DataFrames are not hashable, nor cheap to compare: a batch of its own
+            key = object()
+            kwargs['extra_data'] = extra_data
+
+        self.stats['requests'] += 1
+        batch = self._pending.get(key)
+        if batch is None:
+            batch = self._pending[key] = _Batch()
+            asyncio.ensure_future(self._evaluate(key, batch, model, kwargs))
+        else:
+            self.stats['coalesced'] += 1
+        future = asyncio.get_event_loop().create_future()
+        batch.seeds.append(seed)
+        batch.futures.append(future)
+        return await future
+
+    def _lock(self, model):
+        if self._processes:
+            return _unlocked()
+        if model not in self._locks:
+            self._locks[model] = asyncio.Lock()
+        return self._locks[model]
+
+    async def _evaluate(self, key, batch, model, kwargs):
+        try:
+            async with self._lock(model):
+                del self._pending[key]  # Later requests start the next batch
+                self.stats['evaluations'] += 1
+                results = await asyncio.get_event_loop().run_in_executor(
+                    self.executor, _forecast, self.models[model], batch.seeds, kwargs
+                )
+        except Exception as e:
+            if self._pending.get(key) is batch:
+                del self._pending[key]
+            for future in batch.futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for future, result in zip(batch.futures, results):
+            if not future.done():  # The request may have been cancelled
+                future.set_result(result)
+
+    def close(self):
+        """Shut down the default pool."""
+        if self._own_executor:
+            self.executor.shutdown()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+
+class LocalClient:
+    """In-process client of a ForecastServer, for synchronous code and tests.
+
+    The event loop of the server runs in a background thread.
+
+    Parameters
+    ----------
+    server : ForecastServer
+    """
+    def __init__(self, server):
+        self.server = server
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+    def forecast(self, model, timeout=None, **kwargs):
+        """Forecast a model, see `ForecastServer.forecast`."""
+        return asyncio.run_coroutine_threadsafe(self.server.forecast(model, **kwargs), self.loop).result(timeout)
+
+    def forecast_many(self, requests, timeout=None):
+        """Send concurrent requests, each a dict of arguments of `ForecastServer.forecast`.
+
+        Returns
+        -------
+        The list of the forecasts, in the order of the requests.
+        """
+        async def gather():
+            return await asyncio.gather(*[self.server.forecast(**request) for request in requests])
+        return asyncio.run_coroutine_threadsafe(gather(), self.loop).result(timeout)
+
+    def close(self):
+        """Stop the event loop and the server."""
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.server.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
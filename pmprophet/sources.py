@@ -0,0 +1,88 @@
+import collections.abc
+import os
+
+import numpy as np
+import pandas as pd
+
+PARQUET_EXTENSIONS = ('.parquet', '.pq')
+
+
+def _names(table):
+    return list(table.column_names if hasattr(table, 'column_names') else table.keys())
+
+
+def _column(table, name):
+    """Column of a pandas, Arrow or dict-of-arrays table, as a NumPy array."""
+    if hasattr(table, 'column_names'):  # Arrow Table or RecordBatch
+        return table.column(name).to_numpy()
+    return np.asarray(table[name])
+
+
+def _compact(name, values, dtype):
+    """`ds` as datetime64[ns], other columns as contiguous `dtype` arrays, copied only if needed."""
+    if name == 'ds':
+        if np.issubdtype(values.dtype, np.datetime64):
+            return values.astype('datetime64[ns]', copy=False)
+        return pd.to_datetime(values).values.astype('datetime64[ns]', copy=False)
+    return np.ascontiguousarray(values, dtype=dtype)
+
+
+def _read_parquet(path, columns, chunksize):
+    try:
+        import pyarrow.parquet
+    except ImportError:
+        raise Exception("Reading Parquet files requires pyarrow")
+    return pyarrow.parquet.ParquetFile(path).iter_batches(batch_size=chunksize, columns=columns)
+
+
+def read_columns(source, columns=None, dtype=np.float64, chunksize=10 ** 6):
+    """Read a column-oriented source into compact arrays.
+
+    `ds` is converted once, to datetime64[ns], and the other columns to
+    contiguous arrays of `dtype`. Arrays already of the right type are not
+    copied. Chunked sources are converted chunk by chunk, so that only the
+    compact arrays are kept in memory.
+
+    Parameters
+    ----------
+    source :
+        A dict of arrays, an Arrow Table or RecordBatch, a path (string or
+        os.PathLike) to a Parquet (`.parquet`, `.pq`, read with pyarrow) or
+        CSV file, or an iterable of chunks, each a pd.DataFrame, an Arrow
+        RecordBatch or a dict of arrays (e.g. `pd.read_csv(path,
+        chunksize=...)`).
+    columns : list
+        Columns to read, in addition to 'ds' and 'y', defaults to all.
+    dtype : numpy dtype
+        Type of the columns other than 'ds'.
+    chunksize : int
+        Number of rows of the chunks in which files are read.
+
+    Returns
+    -------
+    A dict with the array of each column.
+    """
+    if columns is not None:
+        columns = ['ds', 'y'] + [column for column in columns if column not in ('ds', 'y')]
+
+    if isinstance(source, os.PathLike):
+        source = os.fspath(source)
+    if isinstance(source, str):
+        if source.lower().endswith(PARQUET_EXTENSIONS):
+            source = _read_parquet(source, columns, chunksize)
+        else:
+            source = pd.read_csv(source, usecols=columns, chunksize=chunksize)
+
+    if isinstance(source, (collections.abc.Mapping, pd.DataFrame)) or hasattr(source, 'column_names'):
+        chunks = [source]
+    else:
+        chunks = source
+
+    parts = collections.OrderedDict()
+    for chunk in chunks:
+        for name in columns or _names(chunk):
+            parts.setdefault(name, []).append(_compact(name, _column(chunk, name), dtype))
+
+    return collections.OrderedDict(
+        (name, values[0] if len(values) == 1 else np.concatenate(values)) for name, values in parts.items()
+    )
@@ -0,0 +1,96 @@
+import io
+import struct
+import zipfile
+
+import numpy as np
+
+ALIGNMENT = 64
+PADDING_HEADER_ID = 0xd935  # Unknown extra fields are skipped by zip readers
+
+
+def save_arrays(path, arrays):
+    """Write arrays to an uncompressed `.npz` file, so that they can be memory-mapped.
+
+    The data of each array is aligned in the file, as Theano requires for
+    the arrays it is given.
+
+    Parameters
+    ----------
+    path : string
+        Destination, the `.npz` extension is appended if missing.
+    arrays : dict
+        Arrays to store, by name.
+    """
+    if not path.endswith('.npz'):
+        path += '.npz'
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for name, value in arrays.items():
+            buffer = io.BytesIO()
+            np.lib.format.write_array(buffer, np.require(value, requirements='C'), allow_pickle=False)
+            data = buffer.getvalue()
+
+            info = zipfile.ZipInfo('%s.npy' % name, date_time=(1980, 1, 1, 0, 0, 0))
+            # The .npy header is padded to a multiple of ALIGNMENT, pad the local
+            # file header with an extra field so that the member starts aligned
+            offset = archive.fp.tell() + 30 + len(info.filename.encode('utf-8')) + 4
+            if data and len(data) * 1.05 > zipfile.ZIP64_LIMIT:
+                offset += 20
+            padding = -offset % ALIGNMENT
+            info.extra = struct.pack('<HH', PADDING_HEADER_ID, padding) + b'\0' * padding
+            archive.writestr(info, data)
+
+
+def _data_offset(handle, info):
+    """Offset in the archive of the data of an uncompressed member."""
+    # The local file header is 30 bytes, followed by the name and extra fields
+    handle.seek(info.header_offset)
+    name_length, extra_length = struct.unpack('<HH', handle.read(30)[26:30])
+    return info.header_offset + 30 + name_length + extra_length
+
+
+def _memmap(path, handle, info):
+    """Memory-map an uncompressed numeric `.npy` member, or return None if it cannot be."""
+    if info.compress_type != zipfile.ZIP_STORED:
+        return None
+    handle.seek(_data_offset(handle, info))
+    version = np.lib.format.read_magic(handle)
+    if version == (1, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(handle)
+    elif version == (2, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(handle)
+    else:
+        return None
+    if dtype.kind not in 'biufc' or not shape or not np.prod(shape):
+        return None
+    return np.memmap(path, dtype=dtype, mode='r', offset=handle.tell(), shape=shape,
+                     order='F' if fortran_order else 'C')
+
+
+def load_arrays(path, mmap=True):
+    """Read the arrays written by `save_arrays`.
+
+    Parameters
+    ----------
+    path : string
+        Path of the `.npz` file.
+    mmap : bool
+        Memory-map the arrays, read-only, instead of reading them in memory,
+        so that the pages are loaded lazily and shared across processes.
+
+    Returns
+    -------
+    A dict with the arrays, by name.
+    """
+    arrays = {}
+    with np.load(path, allow_pickle=False) as npz:
+        if mmap:
+            with open(path, 'rb') as handle, zipfile.ZipFile(handle) as archive:
+                for info in archive.infolist():
+                    name = info.filename[:-len('.npy')]
+                    value = _memmap(path, handle, info)
+                    if value is not None:
+                        arrays[name] = value
+        for name in npz.files:
+            if name not in arrays:
+                arrays[name] = npz[name]
+    return arrays
@@ -0,0 +1,67 @@
+"""Synthetic data and models for the tests and the benchmarks."""
+import numpy as np
+import pandas as pd
+
+from .model import PMProphet
+
+
+def synthetic_data(n_rows, n_regressors=1, freq='D', periods=(7, 365.25), trend=0.001, scale=1., seed=0):
+    """Series with a linear `trend`, a sine of each of the `periods` (in rows), `n_regressors` regressors
+    `r_<idx>` with a coefficient of 0.3, and normal noise of standard deviation `scale`.
+
+    The noiseless series is the one with the same arguments and `scale=0`.
+    """
+    rng = np.random.RandomState(seed)
+    t = np.arange(n_rows)
+    regressors = {'r_%s' % idx: rng.normal(size=n_rows) for idx in range(n_regressors)}
+    y = trend * t + sum(np.sin(2 * np.pi * t / period) for period in periods) + 0.3 * sum(regressors.values())
+    df = pd.DataFrame({
+        'ds': pd.date_range('1900-01-01', periods=n_rows, freq=freq),
+        'y': y + rng.normal(scale=scale, size=n_rows),
+    })
+    for name, value in regressors.items():
+        df[name] = value
+    return df
+
+
+def build_model(df, n_changepoints=10, fourier_order=10, **kwargs):
+    """Model with a growth, yearly and weekly seasonality and the `r_<idx>` regressors of `df`."""
+    m = PMProphet(df, growth=True, intercept=True, name='bench', n_changepoints=n_changepoints, **kwargs)
+    m.add_seasonality(seasonality=365.25, fourier_order=fourier_order)
+    m.add_seasonality(seasonality=7, fourier_order=3)
+    for column in df.columns:
+        if column.startswith('r_'):
+            m.add_regressor(column)
+    return m
+
+
+def fake_trace(m, n_draws, seed=0):
+    """Random posterior draws, in the dtype of the model, for the tests and benchmarks that do not sample.
+
+    The draws of a float32 model are those of a float64 one, rounded.
+    """
+    rng = np.random.RandomState(seed)
+    m.generate_priors()
+    m.trace = {
+        '%s_%s' % (prior, m.name): rng.normal(
+            scale=0.01, size=(n_draws,) + tuple(value.tag.test_value.shape)
+        ).astype(m.dtype, copy=False)
+        for prior, value in m.priors.items()
+    }
+    m.trace['sigma_%s' % m.name] = np.abs(m.trace['sigma_%s' % m.name])
+    return m
+
+
+def float_models(n_rows, n_draws, **kwargs):
+    """float64 and float32 models with the same posterior draws, rounded to single precision for float32."""
+    df = synthetic_data(n_rows, n_regressors=0)
+    return {
+        dtype: fake_trace(build_model(df, n_changepoints=25, dtype=dtype, **kwargs), n_draws)
+        for dtype in ('float64', 'float32')
+    }
+
+
+def relative_difference(reference, value):
+    """Largest absolute difference, relative to the largest absolute value of `reference`."""
+    reference, value = np.asarray(reference, dtype=np.float64), np.asarray(value, dtype=np.float64)
+    return np.max(np.abs(reference - value)) / np.max(np.abs(reference))
@@ -6,6 +6,7 @@ REQUIRED_PACKAGES = [
     'numpy',
     'pandas >= 0.23.0',
     'pymc3',
+    'scipy',
 ]
 
 setup(name='pmprophet',
@@ -16,4 +17,4 @@ setup(name='pmprophet',
       author_email='',
       license='MIT',
       install_requires=REQUIRED_PACKAGES,
-      packages=find_packages())
+      packages=find_packages(exclude=['tests', 'tests.*', 'benchmarks', 'benchmarks.*']))
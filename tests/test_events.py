@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+
+from pmprophet.events import holiday_features, holiday_windows
+
+
+def dense_holiday_features(dates, holiday_spec):
+    """Scale of each holiday on the dates covered by any of its events, with one mask per event."""
+    dates = np.asarray(dates, dtype='datetime64[ns]')
+    features = np.zeros((len(dates), len(holiday_spec)))
+    for column, (_, starts, ends, scale) in enumerate(holiday_spec):
+        covered = np.zeros(len(dates), dtype=bool)
+        for start, end in zip(starts, ends):
+            covered |= (dates >= start) & (dates <= end)
+        features[covered, column] = scale
+    return features
+
+
+def test_holiday_features():
+    rng = np.random.RandomState(0)
+    # Unsorted dates, with duplicates
+    dates = pd.date_range('2000-01-01', periods=200).values[rng.randint(0, 200, size=300)]
+    events = pd.DataFrame({
+        'name': ['a', 'a', 'a', 'b', 'b', 'c'],
+        'start': ['2000-01-10', '2000-01-12', '2000-03-01', '1999-12-25', '2000-07-01', '2001-01-01'],
+        'end': ['2000-01-15', '2000-01-20', '2000-03-01', '2000-01-02', '2000-07-30', '2001-01-05'],
+        'lower_window': [0, 0, -2, 0, 0, 0],
+        'upper_window': [0, 1, 2, 0, 0, 0],
+    })
+    # Overlapping events, events on the edges of the dates and an event after them
+    holiday_spec = [(name, starts, ends, scale) for (name, starts, ends), scale in
+                    zip(holiday_windows(events), [1., 2.5, 3.])]
+
+    features = holiday_features(dates, holiday_spec)
+    assert features.shape == (len(dates), 3)
+    np.testing.assert_array_equal(features.toarray(), dense_holiday_features(dates, holiday_spec))
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from pmprophet.testing import build_model, float_models, relative_difference, synthetic_data
+
+TOLERANCE = 1e-4  # Relative to the largest absolute value
+SAMPLE_KWARGS = {'tune': 50, 'chains': 1, 'cores': 1, 'progressbar': False, 'compute_convergence_checks': False}
+
+
+@pytest.fixture(scope='module')
+def models():
+    """float64 and float32 models with the same posterior draws, rounded to single precision for float32."""
+    return float_models(1000, 200)
+
+
+@pytest.fixture(scope='module')
+def forecasts(models):
+    return {
+        dtype: m.predict(90, quantiles=[0.1, 0.9], random_state=np.random.default_rng(0))
+        for dtype, m in models.items()
+    }
+
+
+def test_float32_dtypes(models, forecasts):
+    m = models['float32']
+    assert all(value.dtype == np.float32 for value in m.predictor.posterior.values())
+    assert m.predictor.history['seasonality'].dtype == np.float32
+    assert m.fit_seasonality().dtype == np.float32
+
+
+@pytest.mark.parametrize('column', ['y_hat', 'y_low', 'y_high', 'y_p10', 'y_p90'])
+def test_float32_forecast(forecasts, column):
+    # The intervals also differ by the noise, drawn from the same seed in either precision
+    assert relative_difference(forecasts['float64'][column], forecasts['float32'][column]) <= TOLERANCE
+
+
+def test_float32_fit_growth(models):
+    reference, value = models['float64'].fit_growth(prior=False), models['float32'].fit_growth(prior=False)
+    assert relative_difference(reference, value) <= TOLERANCE
+
+
+def test_float32_fit_seasonality(models):
+    assert relative_difference(models['float64'].fit_seasonality(), models['float32'].fit_seasonality()) <= TOLERANCE
+
+
+@pytest.mark.parametrize('method', ['MAP', 'NUTS'])
+def test_float32_fit(method):
+    m = build_model(synthetic_data(200), n_changepoints=5, fourier_order=3, dtype='float32')
+    m.fit(50, method=method, sample_kwargs=SAMPLE_KWARGS)
+    assert m.model.logpt.dtype == 'float32'
+    assert all(m.trace['%s_%s' % (prior, m.name)].dtype == np.float32 for prior in m.priors)
+    ddf = m.predict(30, include_history=False)
+    assert np.isfinite(ddf[['y_hat', 'y_low', 'y_high']].values).all()
@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pmprophet import fourier
+
+
+@pytest.mark.parametrize('period, series_order', [(7, 3), (30.5, 5), (365.25, 10), (1, 4)])
+def test_fourier_series(period, series_order):
+    # Before and far from the epoch, at a sub-daily frequency
+    dates = np.concatenate([
+        pd.date_range('1950-01-01', periods=500, freq='420min').values,
+        pd.date_range('2100-06-01', periods=500, freq='D').values,
+    ])
+    features = fourier._fourier_series(dates, period, series_order)
+    assert features.shape == (len(dates), 2 * series_order)
+
+    # Direct sin and cos of each harmonic, of the phase reduced modulo the period
+    t = fourier.days_since_epoch(dates)
+    angle = 2 * np.pi * np.mod(t, period) / period
+    for k in range(1, series_order + 1):
+        np.testing.assert_allclose(features[:, 2 * k - 2], np.sin(k * angle), rtol=0, atol=1e-12)
+        np.testing.assert_allclose(features[:, 2 * k - 1], np.cos(k * angle), rtol=0, atol=1e-12)
+
+
+def test_days_since_epoch():
+    dates = np.array(['1969-12-31T12:00', '1970-01-01', '2000-01-01T06:00'], dtype='datetime64[ns]')
+    np.testing.assert_array_equal(fourier.days_since_epoch(dates), [-0.5, 0., 10957.25])
+
+
+def test_fourier_series_memo():
+    dates = pd.date_range('2000-01-01', periods=100).values
+    features = fourier.fourier_series(dates, 7, 3)
+    assert not features.flags.writeable
+    assert fourier.fourier_series(dates.copy(), 7, 3) is features
+    np.testing.assert_array_equal(features, fourier._fourier_series(dates, 7, 3))
+    assert fourier.fourier_series(dates[1:], 7, 3) is not features
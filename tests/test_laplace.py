@@ -0,0 +1,47 @@
+import numpy as np
+
+from pmprophet import PMProphet
+from pmprophet.testing import synthetic_data
+
+
+def test_laplace_mode():
+    df = synthetic_data(300, n_regressors=2, periods=())
+    m = PMProphet(df, growth=True, intercept=True, name='model')
+    m.add_regressor('r_0')
+    m.add_regressor('r_1')
+    m.generate_priors()
+
+    # With Normal priors, the mode is the ridge solution at the mode of sigma
+    trace = m._laplace_trace(0)
+    blocks = ['intercept', 'growth', 'regressors']
+    beta = np.concatenate([np.ravel(trace['%s_%s' % (prior, m.name)]) for prior in blocks])
+    X = np.column_stack([np.ones(len(df)), np.arange(len(df)), df[['r_0', 'r_1']].values])
+    mu, variance, _ = [np.concatenate(values) for values in zip(*[
+        m._gaussian_prior(prior, size) for prior, size in zip(blocks, [1, 1, 2])
+    ])]
+
+    y, y_std = df['y'].values, df['y'].std()
+    sigma = np.sqrt(np.mean(((y - X.dot(beta)) / y_std) ** 2))
+    np.testing.assert_allclose(trace['sigma_%s' % m.name], [sigma], rtol=1e-6)
+    precision = 1 / (sigma * y_std) ** 2
+    expected = np.linalg.solve(X.T.dot(X) * precision + np.diag(1 / variance),
+                               X.T.dot(y) * precision + mu / variance)
+    np.testing.assert_allclose(beta, expected, rtol=1e-6)
+    # The priors are weak with respect to 300 observations, the standard error being about 0.06
+    np.testing.assert_allclose(beta[3:], [0.3, 0.3], atol=0.2)
+
+
+def test_laplace_draws():
+    df = synthetic_data(300, n_regressors=1, periods=())
+    m = PMProphet(df, growth=True, intercept=True, name='model')
+    m.add_regressor('r_0')
+    m.generate_priors()
+
+    mode = m._laplace_trace(0)
+    np.random.seed(0)
+    draws = m._laplace_trace(4000)
+    assert draws['regressors_model'].shape == (4000, 1)
+    assert draws['growth_model'].shape == (4000,)
+    for name in ('intercept_model', 'growth_model', 'regressors_model'):
+        error = draws[name].std(axis=0).max() / np.sqrt(4000)
+        np.testing.assert_allclose(draws[name].mean(axis=0), mode[name][0], atol=5 * error)
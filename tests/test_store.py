@@ -0,0 +1,36 @@
+import zipfile
+
+import numpy as np
+
+from pmprophet.store import ALIGNMENT, _data_offset, load_arrays, save_arrays
+
+
+def test_save_load_arrays(tmp_path):
+    rng = np.random.RandomState(0)
+    arrays = {
+        'draws': rng.normal(size=(100, 7)),
+        'single': rng.normal(size=(3, 5)).astype(np.float32),
+        'ds': np.arange(11, dtype=np.int64),
+        'fortran': np.asfortranarray(rng.normal(size=(4, 6))),
+        'empty': np.empty((0, 3)),
+        'metadata': np.array('{"name": "model"}'),
+    }
+    path = str(tmp_path / 'model')
+    save_arrays(path, arrays)
+
+    for mmap in (True, False):
+        loaded = load_arrays(path + '.npz', mmap=mmap)
+        assert sorted(loaded) == sorted(arrays)
+        for name, value in arrays.items():
+            assert loaded[name].dtype == value.dtype
+            np.testing.assert_array_equal(loaded[name], value)
+
+    loaded = load_arrays(path + '.npz')
+    for name in ('draws', 'single', 'ds', 'fortran'):
+        assert isinstance(loaded[name], np.memmap)
+        assert loaded[name].offset % ALIGNMENT == 0
+
+    # The data of every member, .npy header included, starts aligned
+    with open(path + '.npz', 'rb') as handle, zipfile.ZipFile(handle) as archive:
+        for info in archive.infolist():
+            assert _data_offset(handle, info) % ALIGNMENT == 0